@@ -0,0 +1,85 @@
+"""Compare add_workday against the plain workalendar implementation.
+
+Run from the repository root:
+
+    $ python benchmarks/bench_calendar.py
+"""
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(TIME_ZONE='America/Sao_Paulo')
+
+import pytz
+from workalendar.america import Brazil
+
+from workflows.utils import add_workday, add_workdays
+
+cal = Brazil()
+
+
+def workalendar_add_workday(initial_datetime, minutes, start_workday_hour=9, end_workday_hour=18):
+    """add_workday as it was before the precomputed calendar."""
+    minutes += (initial_datetime.hour * 60) + initial_datetime.minute
+
+    days = int(minutes / 1440)
+    total_minutes_remains = minutes % 1440
+    hours_remains = int(total_minutes_remains / 60)
+    minutes_remains = total_minutes_remains % 60
+
+    result = cal.add_working_days(initial_datetime, days)
+
+    timezone = pytz.timezone(settings.TIME_ZONE)
+
+    if hours_remains > end_workday_hour:
+        hours_remains = start_workday_hour
+        minutes_remains = 0
+        result = cal.add_working_days(result, 1)
+
+    if hours_remains < start_workday_hour:
+        hours_remains = start_workday_hour
+        minutes_remains = 0
+
+    return timezone.localize(
+        datetime.datetime(year=result.year, month=result.month, day=result.day, hour=hours_remains, minute=minutes_remains)
+    )
+
+
+def main(number=20000):
+    timezone = pytz.timezone(settings.TIME_ZONE)
+    cases = [
+        (timezone.localize(datetime.datetime(2020, 1, 1, 8, 0) + datetime.timedelta(hours=37 * i)), minutes)
+        for i in range(50)
+        for minutes in (60, 2 * 24 * 60, 3 * 24 * 60, 15 * 24 * 60)
+    ]
+
+    for initial_datetime, minutes in cases:
+        assert add_workday(initial_datetime, minutes) == workalendar_add_workday(initial_datetime, minutes)
+
+    for name, function in [('workalendar', workalendar_add_workday), ('precomputed', add_workday)]:
+        seconds = timeit.timeit(lambda: [function(*case) for case in cases], number=number // len(cases) or 1)
+        calls = (number // len(cases) or 1) * len(cases)
+        print(f'{name:12} {seconds / calls * 1e6:8.2f} us/call')
+
+    initial_datetimes = [initial_datetime for initial_datetime, minutes in cases]
+    minutes = [minutes for initial_datetime, minutes in cases]
+    assert add_workdays(initial_datetimes, minutes) == [add_workday(*case) for case in cases]
+    seconds = timeit.timeit(lambda: add_workdays(initial_datetimes, minutes), number=number // len(cases) or 1)
+    print(f'{"batch":12} {seconds / calls * 1e6:8.2f} us/row (every row a distinct slot)')
+
+    # A bulk recompute: tasks activated every minute over a month share deadline slots
+    initial_datetimes = [timezone.localize(datetime.datetime(2020, 3, 1) + datetime.timedelta(minutes=i * 7)) for i in range(number)]
+    minutes = [(3 * 24 * 60, 4 * 60)[i % 2] for i in range(number)]
+    seconds = timeit.timeit(lambda: [add_workday(*case) for case in zip(initial_datetimes, minutes)], number=1)
+    print(f'{"single":12} {seconds / number * 1e6:8.2f} us/row ({number} tasks)')
+    seconds = timeit.timeit(lambda: add_workdays(initial_datetimes, minutes), number=1)
+    print(f'{"batch":12} {seconds / number * 1e6:8.2f} us/row ({number} tasks)')
+
+if __name__ == '__main__':
+    main()
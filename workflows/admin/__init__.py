@@ -1,5 +1,6 @@
 from .activity import *
 from .job import *
+from .outbox import *
 from .state import *
 from .swimlane import *
 from .task import *
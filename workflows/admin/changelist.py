@@ -0,0 +1,120 @@
+from functools import reduce
+from operator import or_
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from workflows.models import State, WorkflowVersion
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator counting unfiltered querysets of large tables with the planner estimate.
+
+    An exact COUNT(*) scans the whole table. When the queryset has no filter
+    and the row estimate kept by ANALYZE on pg_class is above
+    estimate_threshold the estimate is used instead, so page numbers past the
+    real last page may show up until the next ANALYZE.
+    """
+    estimate_threshold = 100000
+
+    def estimate(self):
+        model = self.object_list.model
+        with connections[self.object_list.db].cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row else -1
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = self.estimate()
+            if estimate > self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+class LargeTableAdminMixin(object):
+    """ModelAdmin mixin for the changelists of tables with millions of rows.
+
+    The pages are counted with EstimatedCountPaginator and the total count of
+    the table is not shown. The search_fields are matched exactly, instead of
+    the icontains of every word. The fields of a related model, like
+    job__name, are matched first in a query on that model, and the pks found
+    are searched with job_id IN (...). Each condition of the OR is then served
+    by an index, which an OR across a join or with a subquery is not.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        fields, related = [], {}
+        for field in self.get_search_fields(request):
+            if '__' in field:
+                relation, name = field.split('__', 1)
+                related.setdefault(relation, []).append(name)
+            else:
+                fields.append(field)
+
+        conditions = [Q(**{field: search_term}) for field in fields]
+        for relation, names in related.items():
+            model = queryset.model._meta.get_field(relation).related_model
+            matches = model._default_manager.filter(reduce(or_, [Q(**{name: search_term}) for name in names]))
+            conditions.append(Q(**{f'{relation}__in': list(matches.values_list('pk', flat=True))}))
+        return queryset.filter(reduce(or_, conditions)), False
+
+
+class WorkflowVersionFilter(admin.SimpleListFilter):
+    """Filter by workflow version, listing the versions instead of the related rows in the table."""
+    title = _('workflow version')
+    parameter_name = 'workflow_version'
+    field_path = 'workflow_version'
+
+    def lookups(self, request, model_admin):
+        return [
+            (version.pk, str(version))
+            for version in WorkflowVersion.objects.select_related('workflow').order_by('workflow__slug', 'version')
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            try:
+                return queryset.filter(**{self.field_path: self.value()})
+            except (ValueError, ValidationError) as e:
+                raise IncorrectLookupParameters(e)
+        return queryset
+
+
+class StateFilter(admin.SimpleListFilter):
+    """Filter by state, only shown once a workflow version is selected with WorkflowVersionFilter.
+
+    Only the states of the selected version are listed, not every state ever synced.
+    """
+    title = _('state')
+    parameter_name = 'state'
+
+    def lookups(self, request, model_admin):
+        version = request.GET.get(WorkflowVersionFilter.parameter_name)
+        if not version:
+            return []
+        try:
+            return list(State.objects.filter(workflow_version=version).order_by('order', 'name').values_list('pk', 'name'))
+        except (ValueError, ValidationError):
+            return []
+
+    def queryset(self, request, queryset):
+        if self.value():
+            try:
+                return queryset.filter(state=self.value())
+            except (ValueError, ValidationError) as e:
+                raise IncorrectLookupParameters(e)
+        return queryset
@@ -2,9 +2,11 @@ from django.contrib import admin
 
 from workflows.models import Job
 
+from .changelist import LargeTableAdminMixin, WorkflowVersionFilter
+
 
 @admin.register(Job)
-class JobAdmin(admin.ModelAdmin):
+class JobAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'name',
         'workflow_version',
@@ -14,6 +16,10 @@ class JobAdmin(admin.ModelAdmin):
         'created_at',
         'modified_at',
     )
-    list_filter = ('created_at', 'modified_at', 'created_by')
-    date_hierarchy = 'created_at'
+    list_filter = ('created_at', 'modified_at', WorkflowVersionFilter)
     raw_id_fields = ('created_by', )
+    # Matched exactly, see LargeTableAdminMixin
+    search_fields = ('uuid', 'name')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_listing()
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from workflows.models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'created_at',
+        'signal',
+        'sender',
+        'payload',
+        'available_at',
+        'attempts',
+    )
+    list_filter = ('signal', )
+    readonly_fields = ('signal', 'sender', 'payload', 'last_error')
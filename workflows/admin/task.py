@@ -1,16 +1,21 @@
 from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
 from workflows.models import Task
 
+from .changelist import LargeTableAdminMixin, StateFilter, WorkflowVersionFilter
+
+
+def report_rejected(modeladmin, request, result):
+    uuids = dict(Task.objects.filter(pk__in=result.rejected).values_list('pk', 'uuid'))
+    for pk, reason in result.rejected.items():
+        message = '{message} (Task uuid={uuid})'.format(uuid=uuids.get(pk), message=reason)
+        modeladmin.message_user(request, message, level=messages.ERROR)
+
 
 def abandon_tasks(modeladmin, request, queryset):
-    for task in queryset.all():
-        try:
-            task.abandon()
-        except Exception as e:
-            message = '{message} (Task uuid={uuid})'.format(uuid=task.uuid, message=e.message)
-            modeladmin.message_user(request, message, level=messages.ERROR)
+    report_rejected(modeladmin, request, queryset.abandon_many())
 
 abandon_tasks.short_description = _("Abandon selected tasks")
 
@@ -28,23 +33,13 @@ finish_tasks.short_description = _("Finish selected tasks")
 
 
 def pause_tasks(modeladmin, request, queryset):
-    for task in queryset.all():
-        try:
-            task.pause()
-        except Exception as e:
-            message = '{message} (Task uuid={uuid})'.format(uuid=task.uuid, message=e.message)
-            modeladmin.message_user(request, message, level=messages.ERROR)
+    report_rejected(modeladmin, request, queryset.pause_many(user=request.user))
 
 pause_tasks.short_description = _("Pause selected tasks")
 
 
 def start_tasks(modeladmin, request, queryset):
-    for task in queryset.all():
-        try:
-            task.start(user=request.user, started_by=request.user)
-        except Exception as e:
-            message = '{message} (Task uuid={uuid})'.format(uuid=task.uuid, message=e.message)
-            modeladmin.message_user(request, message, level=messages.ERROR)
+    report_rejected(modeladmin, request, queryset.start_many(user=request.user, started_by=request.user))
 
 start_tasks.short_description = _("Start selected tasks")
 
@@ -61,18 +56,30 @@ reopen_tasks.short_description = _("Reopen selected tasks")
 
 
 def unpause_tasks(modeladmin, request, queryset):
-    for task in queryset.all():
-        try:
-            task.unpause()
-        except Exception as e:
-            message = '{message} (Task uuid={uuid})'.format(uuid=task.uuid, message=e.message)
-            modeladmin.message_user(request, message, level=messages.ERROR)
+    report_rejected(modeladmin, request, queryset.unpause_many())
 
 unpause_tasks.short_description = _("Unpause selected tasks")
 
 
+class DueStatusFilter(admin.SimpleListFilter):
+    title = _('due status')
+    parameter_name = 'due_status'
+
+    def lookups(self, request, model_admin):
+        return Task.DUE_CHOICES
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(annotated_due_status=self.value())
+        return queryset
+
+
+class TaskWorkflowVersionFilter(WorkflowVersionFilter):
+    field_path = 'state__workflow_version'
+
+
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     actions = [ abandon_tasks, finish_tasks, pause_tasks, reopen_tasks, start_tasks, unpause_tasks ]
     list_display = (
         'job',
@@ -82,6 +89,7 @@ class TaskAdmin(admin.ModelAdmin):
         'activated_at',
         'warning_datetime',
         'due_datetime',
+        'due_status',
         'is_started',
         'is_paused',
         'is_finished',
@@ -94,18 +102,32 @@ class TaskAdmin(admin.ModelAdmin):
         'created_at',
         'modified_at',
         'activated_at',
-        'state',
+        TaskWorkflowVersionFilter,
+        StateFilter,
+        DueStatusFilter,
         'is_paused',
         'is_finished',
         'is_canceled'
     )
-    date_hierarchy = 'activated_at'
-    readonly_fields = ['uuid', 'due_status', 'status', 'due_datetime']
-    search_fields = ['state__name__icontains', ]
+    readonly_fields = ['uuid', 'due_status', 'status', 'due_datetime', 'initial_data', 'final_data']
+    # Matched exactly, see LargeTableAdminMixin
+    search_fields = ['uuid', 'job__uuid', 'job__name']
     raw_id_fields = ['job', 'user', 'state', 'started_by', 'paused_by', 'finished_by']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_listing()
+
+    def get_object(self, request, object_id, from_field=None):
+        # The change form shows initial_data and final_data, read along the task
+        field = Task._meta.pk if from_field is None else Task._meta.get_field(from_field)
+        try:
+            return self.get_queryset(request).with_payloads().get(**{field.name: field.to_python(object_id)})
+        except (Task.DoesNotExist, ValidationError, ValueError):
+            return None
+
     def due_status(self, obj):
         return obj.due_status_display
+    due_status.admin_order_field = 'annotated_due_status'
 
     def status(self, obj):
         return obj.status_display
@@ -7,6 +7,17 @@ class WorkflowsAppConf(AppConf):
     DUE_TIME_WARNING = 2*24*60
     MAX_UNASSIGNED_TIME = 12*60
     MAX_UNASSIGNED_TIME_WARNING = 12*60
+    # Leave the tasks deadlines refresh after a State change to the workflow_refresh_deadlines command
+    DEFER_DEADLINE_REFRESH = False
+    # Seconds the activities of each state are kept on the cache to seed new tasks
+    ACTIVITIES_CACHE_TIMEOUT = 5*60
+    # Seconds the swimlanes of each state are kept on the cache to fill new tasks swimlane_slugs
+    SWIMLANES_CACHE_TIMEOUT = 5*60
+    # Seconds the definition_hash of each workflow version is kept on the cache
+    # before the compiled graphs are checked against the database again
+    GRAPH_CACHE_TIMEOUT = 60
+    # Write the workflow signals to the outbox, to be sent by the workflow_outbox command
+    OUTBOX = False
     WORKFLOWS = {}
 
     class Meta:
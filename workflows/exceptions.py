@@ -1,5 +1,10 @@
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.paginator import InvalidPage
 
 
 class SwinlaneDoesNotExist(ObjectDoesNotExist):
     pass
+
+
+class InvalidCursor(InvalidPage):
+    pass
@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from workflows.conf import settings as workflows_settings
+from workflows.registry import registry
+
+
+class WorkflowGraph(object):
+    """Topology of a workflow version compiled from its BaseWorkflow.states.
+
+    Holds, by state class name (State.class_name):
+    state_pks -- The State primary key
+    required -- The state classes that must be finished before the state starts (fan-in)
+    dependents -- The state classes that require the state (reverse index of required)
+    final -- The final state classes
+
+    The graphs are cached by get_workflow_graph under the definition_hash of
+    their version, so a graph compiled before a workflow_sync of the version
+    is rebuilt after it. States missing from state_pks fall back to a
+    database lookup.
+    """
+
+    def __init__(self, state_pks, required, final, initial=None):
+        self.state_pks = state_pks
+        self.required = required
+        self.final = final
+        self.initial = initial
+
+        dependents = {}
+        for class_name, required_class_names in required.items():
+            for required_class_name in required_class_names:
+                dependents.setdefault(required_class_name, set()).add(class_name)
+        self.dependents = {class_name: frozenset(names) for class_name, names in dependents.items()}
+
+    @classmethod
+    def compile(cls, workflow_version):
+        from workflows.models import State
+
+        workflow_class = workflow_version.get_class
+        state_pks = dict(State.objects.filter(workflow_version=workflow_version).values_list('class_name', 'pk'))
+        required = {}
+        final = set()
+        for StateClass in workflow_class.states:
+            class_name = StateClass().fullname
+            required[class_name] = frozenset(RequiredClass().fullname for RequiredClass in StateClass.required)
+            if StateClass.is_final:
+                final.add(class_name)
+
+        initial = workflow_class.initial_state().fullname if getattr(workflow_class, 'initial_state', None) else None
+        return cls(state_pks=state_pks, required=required, final=frozenset(final), initial=initial)
+
+    def state_pk(self, class_name):
+        return self.state_pks.get(class_name)
+
+    def required_pks(self, class_name):
+        """Return the State pks required by the state.
+
+        Returns None when the state, or one of its required states, is unknown
+        to the graph.
+        """
+        required = self.required.get(class_name)
+        if required is None or not all(name in self.state_pks for name in required):
+            return None
+        return [self.state_pks[name] for name in required]
+
+    def dependent_pks(self, class_name):
+        return [self.state_pks[dependent] for dependent in self.dependents.get(class_name, ()) if dependent in self.state_pks]
+
+
+def definition_hash_cache_key(workflow_version_id):
+    return f'workflows:definition_hash:{workflow_version_id}'
+
+
+def get_definition_hash(workflow_version_id):
+    """Return the definition_hash of the workflow version.
+
+    The hash is kept on the Django cache, shared by the processes, for
+    WORKFLOWS_GRAPH_CACHE_TIMEOUT seconds. BaseWorkflow.process sets it on
+    every sync.
+    """
+    from workflows.models import WorkflowVersion
+
+    key = definition_hash_cache_key(workflow_version_id)
+    definition_hash = cache.get(key)
+    if definition_hash is None:
+        definition_hash = WorkflowVersion.objects.filter(pk=workflow_version_id).values_list('definition_hash', flat=True).first() or ''
+        cache.set(key, definition_hash, workflows_settings.WORKFLOWS_GRAPH_CACHE_TIMEOUT)
+    return definition_hash
+
+
+def get_workflow_graph(workflow_version_id, refresh=False):
+    """Return the compiled graph of the workflow version.
+
+    Graphs are built once per process and definition_hash of the version, so
+    the graphs of other processes are rebuilt once they see the hash of a
+    new sync.
+
+    Keyword arguments:
+    refresh -- Compile the graph again even if it is cached (default False)
+    """
+    def loader():
+        from workflows.models import WorkflowVersion
+        return WorkflowGraph.compile(WorkflowVersion.objects.select_related('workflow').get(pk=workflow_version_id))
+
+    key = ('graph', workflow_version_id, get_definition_hash(workflow_version_id))
+    if refresh:
+        registry.discard(key)
+    return registry.get(key, loader)
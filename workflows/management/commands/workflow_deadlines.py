@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from workflows.scheduler import DeadlineScheduler
+
+
+class Command(BaseCommand):
+    help = 'Send task_warning and task_late as the unfinished tasks cross their deadlines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of deadlines notified per transaction')
+        parser.add_argument('--heap-size', type=int, default=10000, help='Number of upcoming deadlines of each kind kept in memory')
+        parser.add_argument('--refresh-interval', type=float, default=600, help='Maximum seconds between two reads of all the upcoming deadlines, the changed tasks are pushed as they are notified')
+        parser.add_argument('--once', action='store_true', help='Notify the crossed deadlines and exit')
+
+    def handle(self, *args, **options):
+        scheduler = DeadlineScheduler(
+            batch_size=options['batch_size'],
+            heap_size=options['heap_size'],
+            refresh_interval=options['refresh_interval'],
+        )
+        scheduler.listen()
+        while True:
+            notified = scheduler.run_pending()
+            if notified:
+                self.stdout.write(f'{notified} deadlines notified')
+            if options['once']:
+                break
+            scheduler.wait(scheduler.next_wakeup())
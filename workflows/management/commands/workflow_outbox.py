@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from workflows.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = 'Send the workflow signals written to the outbox with WORKFLOWS_OUTBOX enabled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of events sent per transaction')
+        parser.add_argument('--max-attempts', type=int, default=10, help='Number of failed deliveries after which an event is no longer retried')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait for new events when the outbox is drained')
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is drained')
+
+    def handle(self, *args, **options):
+        sent = 0
+        while True:
+            count = OutboxEvent.objects.dispatch(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+            sent += count
+            if count < options['batch_size']:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(f'{sent} events processed')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from workflows.models import State, Task
+
+
+class Command(BaseCommand):
+    help = 'Recalculate the deadlines of unfinished tasks for states changed with WORKFLOWS_DEFER_DEADLINE_REFRESH enabled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of tasks updated per statement')
+
+    def handle(self, *args, **options):
+        for state in State.objects.filter(deadlines_outdated=True):
+            # Clear the flag first so a change made while refreshing is not lost
+            if not State.objects.filter(pk=state.pk, deadlines_outdated=True).update(deadlines_outdated=False):
+                continue
+            updated = Task.objects.filter(state=state, is_finished=False).update_deadlines(batch_size=options['batch_size'])
+            self.stdout.write(f'{state}: {updated} tasks updated')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from workflows.scheduler import ActivationScheduler
+
+
+class Command(BaseCommand):
+    help = 'Send task_activated as the scheduled tasks become active'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of tasks activated per transaction')
+        parser.add_argument('--heap-size', type=int, default=10000, help='Number of upcoming activations kept in memory')
+        parser.add_argument('--refresh-interval', type=float, default=600, help='Maximum seconds between two reads of all the upcoming activations, the changed tasks are pushed as they are notified')
+        parser.add_argument('--once', action='store_true', help='Activate the due tasks and exit')
+
+    def handle(self, *args, **options):
+        scheduler = ActivationScheduler(
+            batch_size=options['batch_size'],
+            heap_size=options['heap_size'],
+            refresh_interval=options['refresh_interval'],
+        )
+        scheduler.listen()
+        while True:
+            activated = scheduler.run_pending()
+            if activated:
+                self.stdout.write(f'{activated} tasks activated')
+            if options['once']:
+                break
+            scheduler.wait(scheduler.next_wakeup())
@@ -1,19 +1,31 @@
-import importlib
-
 from django.core.management.base import BaseCommand
 from workflows.conf import settings
+from workflows.registry import get_workflow_class, registry
 
 
 class Command(BaseCommand):
     help = 'Sync workflow settings to DB'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Sync the versions whose definition did not change too')
+
     def handle(self, *args, **options):
+        registry.clear()
         workflows = settings.WORKFLOWS_WORKFLOWS
         for slug in workflows.keys():
             workflow_settings = workflows.get(slug)
             versions = workflow_settings.get('versions')
 
             for version in versions.keys():
-                version_path = versions.get(version)
-                workflow = importlib.import_module(version_path).Workflow()
-                workflow.process(slug=slug, version=version)
+                workflow = get_workflow_class(slug, version)()
+                workflow_version, synced = workflow.process(slug=slug, version=version, force=options['force'])
+                self.stdout.write(f'{slug} v{version}: {"synced" if synced else "unchanged, skipped"}')
+
+                for state_slug, activity_slug, status_slug in workflow.check_orphans(workflow_version):
+                    if status_slug is None:
+                        self.stdout.write(f'    !! Orphan activity {activity_slug} on state {state_slug}')
+                    else:
+                        self.stdout.write(f'    !! Orphan status: {status_slug} on activity {activity_slug} on state {state_slug}')
+
+        # Drop the graphs compiled while syncing
+        registry.clear()
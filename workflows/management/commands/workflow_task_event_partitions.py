@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from workflows.models import TaskEvent
+
+
+class Command(BaseCommand):
+    help = 'Create the monthly partitions of the task event log for the current and the next months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help='Number of months, from the current one, to create partitions for')
+
+    def handle(self, *args, **options):
+        for name in TaskEvent.objects.create_partitions(months=options['months']):
+            self.stdout.write(f'{name} created')
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0009_state_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='state',
+            name='deadlines_outdated',
+            field=models.BooleanField(default=False, editable=False, help_text='Set when the tasks deadlines must be recalculated by the workflow_refresh_deadlines command.'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the task table for writes
+    atomic = False
+
+    dependencies = [
+        ('workflows', '0010_state_deadlines_outdated'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_finished', False), ('user', None)), fields=['-created_at'], name='task_waiting_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['is_finished', 'due_datetime'], name='task_finished_due_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['is_finished', 'warning_datetime'], name='task_finished_warning_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['activated_at'], name='task_activated_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['job', 'state', '-modified_at'], name='task_job_state_idx'),
+        ),
+    ]
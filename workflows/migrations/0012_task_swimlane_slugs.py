@@ -0,0 +1,37 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:41
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without locking the task table for writes
+    atomic = False
+
+    dependencies = [
+        ('workflows', '0011_task_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='swimlane_slugs',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.SlugField(), blank=True, default=list, editable=False, help_text='Copy of the state swimlanes slugs, used to filter tasks by swimlane.', size=None),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE workflows_task SET swimlane_slugs = ARRAY(
+                    SELECT s.slug FROM workflows_state_swimlanes ss
+                    JOIN workflows_swimlane s ON s.id = ss.swimlane_id
+                    WHERE ss.state_id = workflows_task.state_id
+                )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['swimlane_slugs'], name='task_swimlane_slugs_idx'),
+        ),
+    ]
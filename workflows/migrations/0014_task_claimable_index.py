@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:44
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without locking the task table for writes
+    atomic = False
+
+    dependencies = [
+        ('workflows', '0013_cursor_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_finished', False), ('is_started', False), ('user', None)), fields=['activated_at', 'id'], name='task_claimable_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:47
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0014_task_claimable_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('signal', models.CharField(choices=[('job_finished', 'job_finished'), ('task_created', 'task_created'), ('task_finished', 'task_finished')], max_length=50)),
+                ('sender', models.CharField(max_length=100)),
+                ('payload', django.contrib.postgres.fields.jsonb.JSONField(help_text='Keyword arguments of the signal.')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The event is not sent before this date and time.')),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of failed deliveries.')),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox event',
+                'verbose_name_plural': 'Outbox events',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:49
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_table(apps, schema_editor):
+    # The table is partitioned by month, so its primary key must include
+    # created_at. The foreign key columns take the type of the referenced
+    # primary keys, which depends on the project user model.
+    column_types = {
+        name: apps.get_model(model)._meta.pk.rel_db_type(schema_editor.connection)
+        for name, model in [('job_id', 'workflows.Job'), ('task_id', 'workflows.Task'), ('user_id', settings.AUTH_USER_MODEL)]
+    }
+    schema_editor.execute(
+        'CREATE TABLE "workflows_taskevent" ('
+        '"id" bigserial NOT NULL, "created_at" timestamp with time zone NOT NULL, '
+        '"action" smallint NOT NULL CHECK ("action" >= 0), "job_id" {job_id} NOT NULL, '
+        '"task_id" {task_id} NOT NULL, "user_id" {user_id} NULL, '
+        'PRIMARY KEY ("id", "created_at")'
+        ') PARTITION BY RANGE ("created_at")'.format(**column_types)
+    )
+    schema_editor.execute('CREATE TABLE "workflows_taskevent_default" PARTITION OF "workflows_taskevent" DEFAULT')
+    schema_editor.execute('CREATE INDEX "taskevent_job_idx" ON "workflows_taskevent" ("job_id", "created_at")')
+    schema_editor.execute('CREATE INDEX "workflows_taskevent_task_id_58df9183" ON "workflows_taskevent" ("task_id")')
+
+
+def drop_table(apps, schema_editor):
+    schema_editor.execute('DROP TABLE "workflows_taskevent" CASCADE')
+
+
+def create_partitions(apps, schema_editor):
+    # Partitions for the current and the next two months, later ones are
+    # created by the workflow_task_event_partitions command
+    month = django.utils.timezone.now().date().replace(day=1)
+    for i in range(3):
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        schema_editor.execute(
+            'CREATE TABLE "workflows_taskevent_p{:%Y%m}" PARTITION OF "workflows_taskevent" '
+            'FOR VALUES FROM (%s) TO (%s)'.format(month),
+            [month, next_month]
+        )
+        month = next_month
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('workflows', '0015_outboxevent'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_table, drop_table),
+                migrations.RunPython(create_partitions, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='TaskEvent',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('action', models.PositiveSmallIntegerField(choices=[(1, 'Started'), (2, 'Paused'), (3, 'Unpaused'), (4, 'Abandoned'), (5, 'Finished'), (6, 'Canceled'), (7, 'Reopened')])),
+                        ('job', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='workflows.job')),
+                        ('task', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='workflows.task')),
+                        ('user', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'verbose_name': 'Task event',
+                        'verbose_name_plural': 'Task events',
+                    },
+                ),
+                migrations.AddIndex(
+                    model_name='taskevent',
+                    index=models.Index(fields=['job', 'created_at'], name='taskevent_job_idx'),
+                ),
+            ],
+        ),
+        migrations.DeleteModel(
+            name='TaskLog',
+        ),
+    ]
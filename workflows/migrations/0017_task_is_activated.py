@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:51
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without locking the task table for writes
+    atomic = False
+
+    dependencies = [
+        ('workflows', '0016_taskevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='is_activated',
+            field=models.BooleanField(default=False, editable=False, help_text='Set once the task is active: on creation, or by the workflow_scheduler command for scheduled tasks.'),
+        ),
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='signal',
+            field=models.CharField(choices=[('job_finished', 'job_finished'), ('task_activated', 'task_activated'), ('task_created', 'task_created'), ('task_finished', 'task_finished')], max_length=50),
+        ),
+        # Tasks already active are not announced by the scheduler
+        migrations.RunSQL(
+            sql='UPDATE workflows_task SET is_activated = true WHERE activated_at <= now()',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(is_activated=False), fields=['activated_at', 'id'], name='task_activation_idx'),
+        ),
+    ]
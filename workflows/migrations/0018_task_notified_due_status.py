@@ -0,0 +1,45 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:53
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the task table for writes
+    atomic = False
+
+    dependencies = [
+        ('workflows', '0017_task_is_activated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='notified_due_status',
+            field=models.CharField(choices=[['ont', 'On time'], ['war', 'Warning'], ['lat', 'Late']], default='ont', editable=False, help_text='Last deadline crossing notified by the workflow_deadlines command.', max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='signal',
+            field=models.CharField(choices=[('job_finished', 'job_finished'), ('task_activated', 'task_activated'), ('task_created', 'task_created'), ('task_finished', 'task_finished'), ('task_late', 'task_late'), ('task_warning', 'task_warning')], max_length=50),
+        ),
+        # Deadlines already crossed are not notified by the scheduler
+        migrations.RunSQL(
+            sql="""
+                UPDATE workflows_task SET notified_due_status = CASE
+                    WHEN due_datetime <= now() THEN 'lat'
+                    WHEN warning_datetime <= now() THEN 'war'
+                    ELSE 'ont' END
+                WHERE is_finished = false
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_finished', False), ('notified_due_status', 'ont')), fields=['warning_datetime', 'id'], name='task_warning_pending_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_finished', False), models.Q(_negated=True, notified_due_status='lat')), fields=['due_datetime', 'id'], name='task_late_pending_idx'),
+        ),
+    ]
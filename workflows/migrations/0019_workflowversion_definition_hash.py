@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0018_task_notified_due_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowversion',
+            name='definition_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Fingerprint of the synced definition, used by workflow_sync to skip unchanged versions.', max_length=64),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 3.1.14 on 2026-10-17 23:01
+
+import hashlib
+import json
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def payload_digest(data):
+    # Frozen copy of workflows.models.payload.payload_digest
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def copy_data_to_payloads(apps, schema_editor):
+    Payload = apps.get_model('workflows', 'Payload')
+    Task = apps.get_model('workflows', 'Task')
+    tasks = Task.objects.order_by('pk').values_list('pk', 'initial_data', 'final_data')
+    last_pk = 0
+    while True:
+        batch = list(tasks.filter(pk__gt=last_pk)[:1000])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        payloads = {}
+        updates = []
+        for pk, initial_data, final_data in batch:
+            digests = []
+            for data in (initial_data, final_data):
+                digest = None
+                if data is not None:
+                    digest = payload_digest(data)
+                    payloads[digest] = Payload(digest=digest, data=data)
+                digests.append(digest)
+            updates.append(Task(pk=pk, initial_payload_id=digests[0], final_payload_id=digests[1]))
+        Payload.objects.bulk_create(payloads.values(), ignore_conflicts=True)
+        Task.objects.bulk_update(updates, ['initial_payload', 'final_payload'])
+
+    # Check the deferred foreign keys now, the task table can not be altered
+    # with pending trigger events
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def copy_payloads_to_data(apps, schema_editor):
+    schema_editor.execute(
+        'UPDATE workflows_task SET '
+        'initial_data = (SELECT data FROM workflows_payload WHERE digest = initial_payload_id), '
+        'final_data = (SELECT data FROM workflows_payload WHERE digest = final_payload_id)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0019_workflowversion_definition_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payload',
+            fields=[
+                ('digest', models.CharField(editable=False, max_length=64, primary_key=True, serialize=False)),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField(editable=False)),
+            ],
+            options={
+                'verbose_name': 'Payload',
+                'verbose_name_plural': 'Payloads',
+            },
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='final_payload',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='workflows.payload'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='initial_payload',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='workflows.payload'),
+        ),
+        migrations.RunPython(copy_data_to_payloads, copy_payloads_to_data),
+        migrations.RemoveField(
+            model_name='task',
+            name='final_data',
+        ),
+        migrations.RemoveField(
+            model_name='task',
+            name='initial_data',
+        ),
+    ]
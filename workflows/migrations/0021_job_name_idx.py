@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-17 23:04
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without locking the job table for writes
+    atomic = False
+
+    dependencies = [
+        ('workflows', '0020_payload'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='job',
+            index=models.Index(fields=['name'], name='job_name_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from .activity import Activity, ActivityStatus, TaskActivity
 from .job import Job
+from .outbox import OutboxEvent
+from .payload import Payload
 from .state import State
 from .swimlane import Swimlane
-from .task import Task, TaskLog
+from .task import Task, TaskEvent
 from .workflow import Workflow, WorkflowVersion
@@ -1,12 +1,15 @@
 import logging
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
+from workflows.conf import settings as workflows_settings
+
 from .base import UUIDBaseModel
 from .state import State
 from .task import Task
@@ -27,6 +30,33 @@ class ActivityManager(models.Manager):
 
         return activity_status
 
+    @staticmethod
+    def state_cache_key(state_id):
+        return f'workflows:state_activities:{state_id}'
+
+    def get_state_activities(self, state_ids):
+        """Return a dict with the list of activity pks of every state.
+
+        The lists are kept on the Django cache for WORKFLOWS_ACTIVITIES_CACHE_TIMEOUT
+        seconds and dropped whenever an activity is saved or deleted. The states
+        missing from the cache are read in a single query.
+        """
+        keys = {self.state_cache_key(state_id): state_id for state_id in state_ids}
+        cached = cache.get_many(keys.keys())
+        activities = {keys[key]: pks for key, pks in cached.items()}
+
+        missing = [state_id for state_id in state_ids if state_id not in activities]
+        if missing:
+            for state_id in missing:
+                activities[state_id] = []
+            for state_id, pk in self.filter(state__in=missing).values_list('state', 'pk'):
+                activities[state_id].append(pk)
+            cache.set_many(
+                {self.state_cache_key(state_id): activities[state_id] for state_id in missing},
+                workflows_settings.WORKFLOWS_ACTIVITIES_CACHE_TIMEOUT
+            )
+        return activities
+
 
 class Activity(UUIDBaseModel):
     state = models.ForeignKey(State, on_delete=models.CASCADE, related_name='activities')
@@ -57,6 +87,19 @@ class ActivityStatus(UUIDBaseModel):
 
 
 
+class TaskActivityManager(models.Manager):
+
+    def create_for_tasks(self, tasks):
+        """Create the activities of newly created tasks with a single INSERT."""
+        activities = Activity.objects.get_state_activities(set(task.state_id for task in tasks))
+        task_activities = [
+            TaskActivity(task=task, activity_id=activity_id)
+            for task in tasks
+            for activity_id in activities[task.state_id]
+        ]
+        return self.bulk_create(task_activities)
+
+
 class TaskActivity(UUIDBaseModel):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='task_activities')
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='task_activities')
@@ -64,6 +107,7 @@ class TaskActivity(UUIDBaseModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, null=True, on_delete=models.PROTECT, related_name='task_status_selected_by')
     datetime = models.DateTimeField(blank=True, null=True)
     notes = models.TextField(blank=True)
+    objects = TaskActivityManager()
 
     class Meta:
         ordering = ['created_at',]
@@ -92,5 +136,10 @@ class TaskActivity(UUIDBaseModel):
 def post_save_task(sender, instance, created, **kwargs):
     if created:
         # Create the activities for the task
-        for activity in instance.state.activities.all():
-            TaskActivity.objects.create(task=instance, activity=activity)
+        TaskActivity.objects.create_for_tasks([instance])
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+def clear_state_activities_cache(sender, instance, **kwargs):
+    cache.delete(ActivityManager.state_cache_key(instance.state_id))
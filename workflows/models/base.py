@@ -2,8 +2,10 @@ import logging
 import uuid
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django_extensions.db.fields import ShortUUIDField
+from workflows.conf import settings as workflows_settings
+from workflows.signals import OUTBOX_SIGNALS
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +28,26 @@ class DateLogMixin(models.Model):
                              getattr(f, '__name__', f), cls,
                              exc_info=(type(exc), exc, exc.__traceback__))
 
+    @classmethod
+    def send_on_commit(cls, signal, sender=None, events=None, **kwargs):
+        """Send the signal once the current transaction is committed.
+
+        With WORKFLOWS_OUTBOX enabled the signals of workflows.signals.OUTBOX_SIGNALS
+        are written to the outbox within the current transaction instead, and
+        sent later by the workflow_outbox command.
+
+        Keyword arguments:
+        events -- List of keyword arguments, to send the signal once for each (default the kwargs)
+        """
+        events = events if events is not None else [kwargs]
+        if workflows_settings.WORKFLOWS_OUTBOX and signal in OUTBOX_SIGNALS.values():
+            from .outbox import OutboxEvent
+            OutboxEvent.objects.publish(signal, sender, events)
+            return
+
+        for event in events:
+            transaction.on_commit(lambda event=event: cls.send_and_log(signal, sender=sender, **event))
+
 
 class BaseModel(DateLogMixin):
 
@@ -1,14 +1,26 @@
+import itertools
+
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from workflows.pagination import CursorPaginationMixin
+from workflows.signals import task_created
 
 from .base import UUIDBaseModel
+from .payload import Payload
 from .workflow import WorkflowVersion
 
 
+class JobQuerySet(CursorPaginationMixin, models.QuerySet):
+
+    def for_listing(self):
+        """Return the jobs ready to be listed: the workflow version, its workflow and the creator are joined and the data is deferred."""
+        return self.select_related('workflow_version__workflow', 'created_by').defer('data')
+
+
 class JobManager(models.Manager):
 
     def create_job(self, workflow_version, user, name='', data=None, activated_at=None):
@@ -16,6 +28,44 @@ class JobManager(models.Manager):
             activated_at = timezone.now()
         return super(JobManager, self).create(workflow_version=workflow_version, created_by=user, name=name, data=data, activated_at=activated_at)
 
+    def create_jobs(self, workflow_version, rows, batch_size=500):
+        """Create many jobs, and their initial tasks, with bulk INSERTs.
+
+        Each batch of jobs is written with one INSERT for the jobs, one for
+        the initial tasks and one for their activities, inside a transaction.
+        The task_created signals of a batch are sent after it is committed.
+
+        Keyword arguments:
+        workflow_version -- The workflow version of the jobs
+        rows -- Iterable of (name, data, activated_at, user) tuples. A None activated_at means now.
+        batch_size -- Number of jobs written per batch (default 500)
+
+        Returns the list of created jobs.
+        """
+        from .task import Task
+
+        initial_state = workflow_version.states.get(is_initial=True)
+        rows = iter(rows)
+        jobs = []
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                return jobs
+
+            now = timezone.now()
+            with transaction.atomic():
+                created = self.bulk_create([
+                    Job(workflow_version=workflow_version, created_by=user, name=name, data=data, activated_at=activated_at or now)
+                    for name, data, activated_at, user in batch
+                ])
+                payloads = [Payload.objects.for_data(job.data) for job in created]
+                tasks = Task.objects.bulk_create_tasks([
+                    Task(activated_at=job.activated_at, job=job, state=initial_state, initial_payload=payload, final_payload=payload)
+                    for job, payload in zip(created, payloads)
+                ])
+                Task.send_on_commit(task_created, sender=workflow_version.slug, events=[{'task_pk': task.pk} for task in tasks])
+            jobs.extend(created)
+
 
 class Job(UUIDBaseModel):
     """A job is a workflow instance."""
@@ -26,11 +76,17 @@ class Job(UUIDBaseModel):
     start_datetime = models.DateTimeField(blank=True, null=True)
     finish_datetime = models.DateTimeField(blank=True, null=True)
     data = JSONField(blank=True, null=True)
-    objects = JobManager()
+    objects = JobManager.from_queryset(JobQuerySet)()
 
     class Meta:
         verbose_name = _('Job')
         verbose_name_plural = _('Jobs')
+        indexes = [
+            # cursor_page
+            models.Index(fields=['-created_at', '-id'], name='job_created_idx'),
+            # Exact searches of JobAdmin and TaskAdmin
+            models.Index(fields=['name'], name='job_name_idx'),
+        ]
 
     @property
     def is_finished(self):
@@ -0,0 +1,94 @@
+import datetime
+import logging
+
+from django.contrib.postgres.fields import JSONField
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from workflows.signals import OUTBOX_SIGNALS
+
+from .base import DateLogMixin
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEventManager(models.Manager):
+
+    def publish(self, signal, sender, events):
+        """Write the events of a signal to the outbox with a single INSERT.
+
+        Keyword arguments:
+        signal -- One of the signals of workflows.signals.OUTBOX_SIGNALS
+        sender -- The sender the signal is sent with
+        events -- List of the keyword arguments of each send
+        """
+        name = next(name for name, outbox_signal in OUTBOX_SIGNALS.items() if outbox_signal is signal)
+        return self.bulk_create([OutboxEvent(signal=name, sender=sender, payload=payload) for payload in events])
+
+    def dispatch(self, batch_size=100, max_attempts=10):
+        """Send a batch of pending events to the signal receivers.
+
+        The batch is locked with SELECT ... FOR UPDATE SKIP LOCKED, so several
+        workers may drain the outbox. Delivered events are deleted. Each event
+        is sent inside its own savepoint: when a receiver fails the savepoint
+        is rolled back, so a database error does not abort the batch, and the
+        event is kept with its attempts and last_error updated. It is retried
+        with an exponential backoff, up to max_attempts times. Every receiver
+        of the signal is called again on a retry, so delivery is at least once
+        and receivers must be idempotent.
+
+        Returns the number of events of the batch.
+        """
+        with transaction.atomic():
+            events = list(
+                self.filter(available_at__lte=timezone.now(), attempts__lt=max_attempts)
+                .order_by('available_at', 'pk')
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            delivered, failed = [], []
+            for event in events:
+                with transaction.atomic():
+                    errors = [
+                        (receiver, exc) for receiver, exc in OUTBOX_SIGNALS[event.signal].send_robust(sender=event.sender, **event.payload)
+                        if exc is not None
+                    ]
+                    if errors:
+                        transaction.set_rollback(True)
+                if not errors:
+                    delivered.append(event.pk)
+                    continue
+
+                for receiver, exc in errors:
+                    logger.error("signal handler %s failed on %r",
+                                 getattr(receiver, '__name__', receiver), event,
+                                 exc_info=(type(exc), exc, exc.__traceback__))
+                event.attempts += 1
+                event.last_error = '\n'.join(repr(exc) for receiver, exc in errors)
+                event.modified_at = timezone.now()
+                event.available_at = event.modified_at + datetime.timedelta(seconds=2 ** event.attempts)
+                failed.append(event)
+
+            self.filter(pk__in=delivered).delete()
+            self.bulk_update(failed, ['attempts', 'last_error', 'available_at', 'modified_at'])
+        return len(events)
+
+
+class OutboxEvent(DateLogMixin):
+    """A workflow signal waiting to be sent by the workflow_outbox command."""
+    signal = models.CharField(max_length=50, choices=[(name, name) for name in OUTBOX_SIGNALS])
+    sender = models.CharField(max_length=100)
+    payload = JSONField(help_text=_('Keyword arguments of the signal.'))
+    available_at = models.DateTimeField(default=timezone.now, help_text=_('The event is not sent before this date and time.'))
+    attempts = models.PositiveIntegerField(default=0, help_text=_('Number of failed deliveries.'))
+    last_error = models.TextField(blank=True)
+    objects = OutboxEventManager()
+
+    class Meta:
+        verbose_name = _('Outbox event')
+        verbose_name_plural = _('Outbox events')
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.signal, self.payload)
@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+from django.contrib.postgres.fields import JSONField
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+def payload_digest(data):
+    """Return the sha256 hex digest of the canonical JSON encoding of data."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class PayloadManager(models.Manager):
+
+    def for_data(self, data):
+        """Return the unsaved Payload instance of data, or None for no data."""
+        if data is None:
+            return None
+        return Payload(digest=payload_digest(data), data=data)
+
+    def store(self, payloads):
+        """Write the payloads missing from the table with a single INSERT ... ON CONFLICT DO NOTHING.
+
+        Keyword arguments:
+        payloads -- Iterable of Payload instances, None items are ignored
+        """
+        payloads = {payload.digest: payload for payload in payloads if payload is not None and payload._state.adding}
+        if payloads:
+            self.bulk_create(payloads.values(), ignore_conflicts=True)
+        for payload in payloads.values():
+            payload._state.adding = False
+
+
+class Payload(models.Model):
+    """A JSON document of the tasks data, stored once and addressed by its digest.
+
+    The initial_data and final_data of the tasks point to their payloads, so a
+    job data copied along its tasks is stored once. Payloads are immutable: a
+    change of the data is a new payload.
+    """
+    digest = models.CharField(max_length=64, primary_key=True, editable=False)
+    data = JSONField(editable=False)
+    objects = PayloadManager()
+
+    class Meta:
+        verbose_name = _('Payload')
+        verbose_name_plural = _('Payloads')
+
+    def __str__(self):
+        return self.digest
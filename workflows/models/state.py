@@ -1,12 +1,14 @@
 import datetime
-import importlib
 import logging
 
-import humanize
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.fields import AutoSlugField
+from workflows.conf import settings as workflows_settings
+from workflows.graph import get_workflow_graph
+from workflows.registry import get_state_class
 
 from .base import UUIDBaseModel
 from .swimlane import Swimlane
@@ -16,6 +18,36 @@ from .workflow import WorkflowVersion
 logger = logging.getLogger(__name__)
 
 
+class StateManager(models.Manager):
+
+    @staticmethod
+    def swimlanes_cache_key(state_id):
+        return f'workflows:state_swimlanes:{state_id}'
+
+    def get_swimlane_slugs(self, state_ids):
+        """Return a dict with the list of swimlane slugs of every state.
+
+        The lists are kept on the Django cache for WORKFLOWS_SWIMLANES_CACHE_TIMEOUT
+        seconds and dropped when the state swimlanes change. The states missing
+        from the cache are read in a single query.
+        """
+        keys = {self.swimlanes_cache_key(state_id): state_id for state_id in state_ids}
+        cached = cache.get_many(keys.keys())
+        swimlanes = {keys[key]: slugs for key, slugs in cached.items()}
+
+        missing = [state_id for state_id in state_ids if state_id not in swimlanes]
+        if missing:
+            for state_id in missing:
+                swimlanes[state_id] = []
+            for state_id, slug in self.model.swimlanes.through.objects.filter(state__in=missing).order_by('swimlane__slug').values_list('state', 'swimlane__slug'):
+                swimlanes[state_id].append(slug)
+            cache.set_many(
+                {self.swimlanes_cache_key(state_id): swimlanes[state_id] for state_id in missing},
+                workflows_settings.WORKFLOWS_SWIMLANES_CACHE_TIMEOUT
+            )
+        return swimlanes
+
+
 class State(UUIDBaseModel):
     workflow_version = models.ForeignKey(WorkflowVersion, on_delete=models.PROTECT, related_name='states')
     name = models.CharField(max_length=100)
@@ -30,6 +62,11 @@ class State(UUIDBaseModel):
     max_unassigned_time = models.PositiveIntegerField(help_text=_('Max time, in minutes, the task may reamin unassigned.'))
     max_unassigned_time_warning = models.PositiveIntegerField(help_text=_('Max time, in minutes, the task may reamin unassigned before it\'s status is set to warning.'))
     order = models.PositiveIntegerField(default=0)
+    deadlines_outdated = models.BooleanField(default=False, editable=False, help_text=_('Set when the tasks deadlines must be recalculated by the workflow_refresh_deadlines command.'))
+    objects = StateManager()
+
+    # Fields used to calculate the tasks deadlines
+    DEADLINE_FIELDS = ['due_time', 'due_time_warning', 'max_unassigned_time', 'max_unassigned_time_warning']
 
     class Meta:
         unique_together = [['workflow_version', 'class_name'], ['workflow_version', 'slug']]
@@ -37,27 +74,58 @@ class State(UUIDBaseModel):
     def __str__(self):
         return '{} - {}'.format(self.workflow_version.workflow.description, self.name)
 
+    def save(self, *args, **kwargs):
+        # deadlines_outdated is only changed with update(), so a full save of a
+        # stale instance never clears a pending deadlines refresh.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'deadlines_outdated'
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.track_deadlines()
+        return instance
+
+    def track_deadlines(self):
+        """Remember the current deadline fields values to detect changes on the next save."""
+        self._tracked_deadlines = {field: self.__dict__.get(field) for field in self.DEADLINE_FIELDS}
+
+    @property
+    def deadlines_changed(self):
+        tracked = getattr(self, '_tracked_deadlines', None)
+        if tracked is None:
+            return True
+        return any(tracked[field] != self.__dict__.get(field) for field in self.DEADLINE_FIELDS)
+
     @property
     def due_time_humanized(self):
+        import humanize
+
         return humanize.naturaldelta(datetime.timedelta(minutes=self.due_time))
 
     @property
     def due_time_warning_humanized(self):
+        import humanize
+
         return humanize.naturaldelta(datetime.timedelta(minutes=self.due_time_warning))
 
 
     @property
     def get_class(self):
-        module = '.'.join(self.class_name.split('.')[:-1])
-        class_name = self.class_name.split('.')[-1]
-        module_ = importlib.import_module(module)
-        class_ = getattr(module_, class_name)
-        return class_
+        return get_state_class(self.class_name)
+
+    @property
+    def graph(self):
+        return get_workflow_graph(self.workflow_version_id)
 
     def next(self, data={}, task=None):
         # Get next states  by calling the subclass State class next() method (The one you defined on your class)
         next_state_classes = self.get_class().next(data=data, task=task)
-        next_states = []
+        transitions = []
         for state_class in next_state_classes:
             try:
                 from workflows.workflow import State as WorkflowState
@@ -73,7 +141,23 @@ class State(UUIDBaseModel):
                     logger.error('The returned state must be a dict or a subclass of State')
                     raise Exception('The returned state must be a dict or a subclass of State')
 
-                next_state = State.objects.get(workflow_version=self.workflow_version, class_name=class_name)
+                transitions.append((class_name, activated_at, additional_due_time))
+            except Exception as e:
+                logger.exception('Error creating next state')
+                logger.exception(e)
+
+        # Route through the compiled graph: a single query for all the next states
+        graph = self.graph
+        state_pks = [graph.state_pk(class_name) for class_name, activated_at, additional_due_time in transitions]
+        states = State.objects.in_bulk([pk for pk in state_pks if pk])
+
+        next_states = []
+        for (class_name, activated_at, additional_due_time), state_pk in zip(transitions, state_pks):
+            try:
+                next_state = states.get(state_pk)
+                if next_state is None:
+                    # Not in the compiled graph (e.g. synced after it was built)
+                    next_state = State.objects.get(workflow_version_id=self.workflow_version_id, class_name=class_name)
                 next_states.append({'state': next_state, 'activated_at': activated_at, 'additional_due_time': additional_due_time})
             except Exception as e:
                 logger.exception('Error creating next state')
@@ -82,6 +166,12 @@ class State(UUIDBaseModel):
         return next_states
 
     def required_states(self):
-        required = self.get_class().required
-        classes = [name().fullname for name in required]
-        return State.objects.filter(workflow_version=self.workflow_version, class_name__in=classes)
+        required_pks = self.graph.required_pks(self.class_name)
+        if required_pks is None:
+            required = self.get_class().required
+            classes = [name().fullname for name in required]
+            return State.objects.filter(workflow_version=self.workflow_version, class_name__in=classes)
+
+        if not required_pks:
+            return State.objects.none()
+        return State.objects.filter(pk__in=required_pks)
@@ -10,3 +10,17 @@ class Swimlane(UUIDBaseModel):
 
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.track_slug()
+        return instance
+
+    def track_slug(self):
+        """Remember the current slug to detect a rename on the next save."""
+        self._tracked_slug = self.__dict__.get('slug')
+
+    @property
+    def slug_changed(self):
+        return getattr(self, '_tracked_slug', None) != self.__dict__.get('slug')
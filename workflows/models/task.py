@@ -1,20 +1,34 @@
 import datetime
+import logging
+from collections import namedtuple
+from functools import reduce
+from operator import or_
 
 from django.conf import settings
-from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import F, Q
-from django.db.models.signals import post_save
+from django.db import connection, models, transaction
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from workflows.conf import settings as workflows_settings
+from workflows.graph import get_workflow_graph
+from workflows.pagination import CursorPaginationMixin
+from workflows.scheduler import notify_schedule_changed
 from workflows.signals import job_finished, task_created, task_finished
-from workflows.utils import add_workday
+from workflows.utils import add_workday, calculate_deadlines
 
 from .base import UUIDBaseModel
 from .job import Job
+from .payload import Payload
 from .state import State
+from .swimlane import Swimlane
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=Job)
@@ -25,18 +39,101 @@ def post_save_job(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=State)
 def post_save_state(sender, instance, created, **kwargs):
-    if not created:
-        for task in Task.objects.filter(is_finished=False):
-            task.warning_datetime = task.calculate_warning_datetime()
-            task.due_datetime = task.calculate_due_datetime()
-            task.save()
+    if not created and instance.deadlines_changed:
+        Task.objects.refresh_state_deadlines([instance])
+    instance.track_deadlines()
+
+
+# Outcome of a bulk transition: number of updated tasks and a dict with the reason each rejected task pk was rejected
+TransitionResult = namedtuple('TransitionResult', ['updated', 'rejected'])
+
+
+@receiver(m2m_changed, sender=State.swimlanes.through)
+def state_swimlanes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Task.swimlane_slugs in sync with the swimlanes of the task state."""
+    if reverse and action == 'pre_clear':
+        instance._cleared_states = list(instance.states.values_list('pk', flat=True))
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    if not reverse:
+        state_ids = [instance.pk]
+    elif action == 'post_clear':
+        state_ids = getattr(instance, '_cleared_states', [])
+    else:
+        state_ids = pk_set
+
+    Task.objects.sync_swimlane_slugs(state_ids)
+
 
+@receiver(post_save, sender=Swimlane)
+def post_save_swimlane(sender, instance, created, **kwargs):
+    """Copy the new slug of a renamed swimlane to the tasks of its states."""
+    if not created and instance.slug_changed:
+        Task.objects.sync_swimlane_slugs(list(instance.states.values_list('pk', flat=True)))
+    instance.track_slug()
 
-class TaskQuerySet(models.QuerySet):
+
+@receiver(pre_delete, sender=Swimlane)
+def pre_delete_swimlane(sender, instance, **kwargs):
+    # The State.swimlanes rows are deleted by cascade, with no m2m_changed signal
+    instance._deleted_states = list(instance.states.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Swimlane)
+def post_delete_swimlane(sender, instance, **kwargs):
+    """Remove the slug of a deleted swimlane from the tasks of its states."""
+    Task.objects.sync_swimlane_slugs(getattr(instance, '_deleted_states', []))
+
+
+class TaskQuerySet(CursorPaginationMixin, models.QuerySet):
 
     def is_active(self):
         return self.filter(activated_at__lte=timezone.now())
 
+    def calculate_deadlines(self):
+        """Return a list of (pk, due_datetime, warning_datetime) computed in batch for the tasks."""
+        rows = list(self.values_list('pk', 'activated_at', 'state__due_time', 'state__due_time_warning', 'additional_due_time'))
+        due_datetimes, warning_datetimes = calculate_deadlines(
+            [activated_at for pk, activated_at, due_time, due_time_warning, additional_due_time in rows],
+            [due_time + additional_due_time for pk, activated_at, due_time, due_time_warning, additional_due_time in rows],
+            [due_time_warning + additional_due_time for pk, activated_at, due_time, due_time_warning, additional_due_time in rows],
+        )
+        return list(zip([row[0] for row in rows], due_datetimes, warning_datetimes))
+
+    def update_deadlines(self, batch_size=1000):
+        """Recalculate and store the due and warning datetimes of the tasks.
+
+        Tasks are processed in chunks of batch_size rows, each one written with a
+        single bulk UPDATE. Task.save() and its signals are not called, the
+        deadline notifications are reset and the schedulers notified like on
+        Task.save().
+
+        Returns the number of updated tasks.
+        """
+        updated = 0
+        last_pk = None
+        queryset = self.order_by('pk')
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            deadlines = chunk[:batch_size].calculate_deadlines()
+            if not deadlines:
+                return updated
+
+            now = timezone.now()
+            tasks = [Task(pk=pk, due_datetime=due_datetime, warning_datetime=warning_datetime, modified_at=now) for pk, due_datetime, warning_datetime in deadlines]
+            Task.objects.bulk_update(tasks, ['due_datetime', 'warning_datetime', 'modified_at'])
+            Task.objects.filter(pk__in=[task.pk for task in tasks]).exclude(notified_due_status=Task.DUE_ON_TIME).update(
+                notified_due_status=Case(
+                    When(warning_datetime__gt=now, then=Value(Task.DUE_ON_TIME)),
+                    When(due_datetime__gt=now, notified_due_status=Task.DUE_LATE, then=Value(Task.DUE_WARNING)),
+                    default=F('notified_due_status'),
+                )
+            )
+            notify_schedule_changed([task.pk for task in tasks])
+            updated += len(tasks)
+            last_pk = deadlines[-1][0]
+
     def filter_waiting_tasks(self, workflow=None, swimlanes=None):
         """Return a list of tasks with no user assigned to it
 
@@ -53,6 +150,46 @@ class TaskQuerySet(models.QuerySet):
 
         return tasks
 
+    def filter_claimable_tasks(self, workflow=None, swimlanes=None):
+        """Return the active waiting tasks, oldest first, in the order they are claimed."""
+        return self.is_active().filter_waiting_tasks(workflow=workflow, swimlanes=swimlanes).filter(is_started=False).order_by('activated_at', 'pk')
+
+    def claim(self, user, n=1, workflow=None, swimlanes=None):
+        """Start and assign to user up to n of the oldest claimable tasks.
+
+        The tasks are picked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent
+        workers never wait for each other nor claim the same task: rows being
+        claimed by another transaction are skipped.
+
+        Keyword arguments:
+        user -- The user that starts and is assigned to the tasks
+        n -- Maximum number of tasks to claim (default 1)
+        worflow -- Use to filter by workflow (default None)
+        swimlanes -- Use to filter by swimlanes (default None)
+
+        Returns the list of claimed tasks, possibly empty.
+        """
+        with transaction.atomic():
+            tasks = list(
+                self.filter_claimable_tasks(workflow=workflow, swimlanes=swimlanes)
+                .select_for_update(skip_locked=True, of=('self', ))[:n]
+            )
+            if not tasks:
+                return tasks
+
+            values = {'is_started': True, 'start_datetime': timezone.now(), 'started_by': user, 'user': user, 'modified_at': timezone.now()}
+            self.model.objects.filter(pk__in=[task.pk for task in tasks]).update(**values)
+            TaskEvent.objects.log(TaskEvent.START, [(task.pk, task.job_id) for task in tasks], user=user)
+        for task in tasks:
+            for field, value in values.items():
+                setattr(task, field, value)
+        return tasks
+
+    def claim_next(self, user, workflow=None, swimlanes=None):
+        """Claim the oldest claimable task for user, see claim. Returns None when there is none."""
+        tasks = self.claim(user, n=1, workflow=workflow, swimlanes=swimlanes)
+        return tasks[0] if tasks else None
+
     def filter_in_progress(self):
         return self.is_active().exclude(user=None).exclude(is_finished=True).exclude(is_paused=True)
 
@@ -89,14 +226,93 @@ class TaskQuerySet(models.QuerySet):
         return tasks
 
 
+    def annotate_due_status(self):
+        """Annotate the tasks with annotated_due_status, one of Task.DUE_CHOICES.
+
+        Computed in SQL from the stored due_datetime and warning_datetime, with
+        the same rules as filter_late_tasks, filter_warning_tasks and
+        filter_on_time_tasks, so it can be used to filter, sort and count.
+        """
+        now = timezone.now()
+        return self.annotate(annotated_due_status=Case(
+            When(Q(is_finished=True, finish_datetime__gt=F('due_datetime')) | Q(is_finished=False, due_datetime__lt=now), then=Value(Task.DUE_LATE)),
+            When(
+                Q(is_finished=True, finish_datetime__lte=F('due_datetime'), finish_datetime__gt=F('warning_datetime')) |
+                Q(is_finished=False, warning_datetime__lt=now, due_datetime__gt=now),
+                then=Value(Task.DUE_WARNING)
+            ),
+            default=Value(Task.DUE_ON_TIME),
+            output_field=CharField(max_length=3, choices=Task.DUE_CHOICES),
+        ))
+
+    def for_listing(self):
+        """Return the tasks ready to be listed, with a single query.
+
+        The job, the state and its workflow version and workflow, and the user
+        are joined, the job data is deferred and the due status is annotated,
+        so __str__, workflow, status, due_status, time_until_due and
+        overdue_time make no queries. The data properties still read their
+        payload, unless with_payloads() is chained.
+        """
+        return (
+            self.select_related('job', 'state__workflow_version__workflow', 'user')
+            .defer('job__data')
+            .annotate_due_status()
+        )
+
+    def with_payloads(self):
+        """Return the tasks with their payloads joined, so initial_data, final_data and data make no queries."""
+        return self.select_related('initial_payload', 'final_payload')
+
+    def annotate_status(self):
+        """Annotate the tasks with annotated_status, one of Task.STATUS_CHOICES, computed in SQL."""
+        return self.annotate(annotated_status=Case(
+            When(is_started=False, then=Value(Task.STATUS_WAITING)),
+            When(is_finished=True, then=Value(Task.STATUS_FINISHED)),
+            When(is_paused=True, then=Value(Task.STATUS_PAUSED)),
+            default=Value(Task.STATUS_IN_PROGRESS),
+            output_field=CharField(max_length=3, choices=Task.STATUS_CHOICES),
+        ))
+
+    def summary(self, cache_key=None, cache_timeout=60):
+        """Count the tasks by workflow, swimlane, status and due status in one grouped query.
+
+        Returns a list of dicts with the workflow and swimlane slugs, the status,
+        the due status and the count of tasks. A task is counted once for each
+        swimlane of its state.
+
+        Keyword arguments:
+        cache_key -- Key to keep the result on the Django cache under, naming the filters of the queryset (default None, not cached)
+        cache_timeout -- Seconds to keep the result on the cache (default 60)
+        """
+        if cache_key:
+            key = f'workflows:summary:{cache_key}'
+            rows = cache.get(key)
+            if rows is not None:
+                return rows
+
+        rows = list(
+            self.annotate_status()
+            .annotate_due_status()
+            .order_by()
+            .values(
+                workflow=F('state__workflow_version__workflow__slug'),
+                swimlane=F('state__swimlanes__slug'),
+                status=F('annotated_status'),
+                due_status=F('annotated_due_status'),
+            )
+            .annotate(count=Count('pk'))
+        )
+
+        if cache_key:
+            cache.set(key, rows, cache_timeout)
+        return rows
+
     def filter_by_swimlanes(self, swimlanes):
         if isinstance(swimlanes, str):
             swimlanes = [swimlanes, ]
 
-        query = Q()
-        for swinlane in swimlanes:
-            query.add(Q(state__swimlanes__slug=swinlane), Q.OR)
-        return self.filter(query)
+        return self.filter(swimlane_slugs__overlap=list(swimlanes))
 
     def filter_assigned_tasks(self, user=None, workflow=None, swimlanes=None):
         """Return a list of tasks assigned to some user
@@ -116,6 +332,106 @@ class TaskQuerySet(models.QuerySet):
             tasks = tasks.filter_by_swimlanes(swimlanes)
         return tasks
 
+    def _update_and_log(self, values, action, user=None):
+        """Update the tasks and append an action event for each one, in a transaction.
+
+        The tasks are locked while they are read, so a concurrent transition
+        can not make the events and the updated rows differ.
+
+        Returns the number of updated tasks.
+        """
+        with transaction.atomic():
+            tasks = list(self.select_for_update(of=('self', )).values_list('pk', 'job_id'))
+            if not tasks:
+                return 0
+            values['modified_at'] = timezone.now()
+            updated = self.model.objects.filter(pk__in=[pk for pk, job_id in tasks]).update(**values)
+            TaskEvent.objects.log(action, tasks, user=user)
+        return updated
+
+    def _transition(self, rejections, values, action, user=None):
+        """Apply a transition to every task satisfying its preconditions with a single UPDATE.
+
+        Keyword arguments:
+        rejections -- List of (Q, reason) pairs. Tasks matching a Q are rejected with its reason (first match wins)
+        values -- Fields to update on the accepted tasks
+        action -- The TaskEvent action logged for the accepted tasks
+        user -- The user logged with the events (default None)
+        """
+        reason = Case(*[When(query, then=Value(str(message))) for query, message in rejections], default=None, output_field=CharField())
+        rejected = dict(self.annotate(rejection=reason).exclude(rejection=None).values_list('pk', 'rejection'))
+
+        updated = self.exclude(reduce(or_, [query for query, message in rejections]))._update_and_log(values, action, user=user)
+        return TransitionResult(updated=updated, rejected=rejected)
+
+    def start_many(self, started_by, user):
+        """Bulk version of Task.start."""
+        return self._transition(
+            [
+                (Q(is_finished=True), _("The task is already finished.")),
+                (Q(is_started=True), _("The task is already started.")),
+            ],
+            {'is_started': True, 'start_datetime': timezone.now(), 'started_by': started_by, 'user': user},
+            TaskEvent.START,
+            user=started_by
+        )
+
+    def pause_many(self, user=None):
+        """Bulk version of Task.pause."""
+        return self._transition(
+            [
+                (Q(is_paused=True), _("The task is already paused.")),
+                (Q(is_started=False), _("It's not possible to pause an unstarted task.")),
+                (Q(is_finished=True), _("It's not possible to pause a finished task.")),
+            ],
+            {'is_paused': True, 'paused_by': user, 'pause_datetime': timezone.now()},
+            TaskEvent.PAUSE,
+            user=user
+        )
+
+    def unpause_many(self):
+        """Bulk version of Task.unpause."""
+        return self._transition(
+            [(Q(is_paused=False), _("The task is not paused."))],
+            {'is_paused': False},
+            TaskEvent.UNPAUSE
+        )
+
+    def abandon_many(self):
+        """Bulk version of Task.abandon."""
+        return self._transition(
+            [(Q(is_finished=True), _("It's not possible to abandon a finished task"))],
+            {
+                'is_paused': False,
+                'is_started': False,
+                'pause_datetime': None,
+                'paused_by': None,
+                'user': None,
+                'started_by': None,
+                'start_datetime': None,
+            },
+            TaskEvent.ABANDON
+        )
+
+    def cancel_many(self, finished_by, data=None):
+        """Bulk version of Task.cancel. Finished tasks are rejected."""
+        values = {
+            'is_canceled': True,
+            'is_finished': True,
+            'is_paused': False,
+            'finish_datetime': timezone.now(),
+            'finished_by': finished_by,
+        }
+        if data:
+            values['final_payload'] = Payload.objects.for_data(data)
+            Payload.objects.store([values['final_payload']])
+        return self._transition(
+            [(Q(is_finished=True), _("It's not possible to cancel a finished task."))],
+            values,
+            TaskEvent.CANCEL,
+            user=finished_by
+        )
+
     # TOOD: Change name to filter unfinished tasks maybe
     def filter_active_tasks(self, job=None):
         """Return the list of tasks not yet finished for the job."""
@@ -127,14 +443,37 @@ class TaskQuerySet(models.QuerySet):
 
 class TaskManager(models.Manager):
 
+    def refresh_state_deadlines(self, states):
+        """Recalculate the deadlines of the unfinished tasks of the states.
+
+        With WORKFLOWS_DEFER_DEADLINE_REFRESH the states are only flagged, and
+        their tasks refreshed later by the workflow_refresh_deadlines command.
+        """
+        if not states:
+            return
+        if workflows_settings.WORKFLOWS_DEFER_DEADLINE_REFRESH:
+            State.objects.filter(pk__in=[state.pk for state in states]).update(deadlines_outdated=True)
+            for state in states:
+                state.deadlines_outdated = True
+        else:
+            self.filter(state__in=states, is_finished=False).update_deadlines()
+
+    def sync_swimlane_slugs(self, state_ids):
+        """Copy the current swimlanes slugs of the states to their tasks swimlane_slugs."""
+        for state_id in state_ids:
+            cache.delete(State.objects.swimlanes_cache_key(state_id))
+        for state_id, slugs in State.objects.get_swimlane_slugs(state_ids).items():
+            self.filter(state_id=state_id).update(swimlane_slugs=slugs)
+
     def create_initial_task(self, job):
         initial_state = job.workflow_version.states.get(is_initial=True)
+        payload = Payload.objects.for_data(job.data)
         return super(TaskManager, self).create(
             activated_at=job.activated_at,
             job=job,
             state=initial_state,
-            initial_data=job.data,
-            final_data=job.data)
+            initial_payload=payload,
+            final_payload=payload)
 
     def get_forms(self, task):
         if hasattr(task.state.get_class, 'forms'):
@@ -142,47 +481,128 @@ class TaskManager(models.Manager):
         else:
             return {}
 
+    def bulk_create_tasks(self, tasks, batch_size=None):
+        """Create many tasks with bulk INSERTs.
+
+        The deadlines are calculated in batch, the new payloads are written
+        with a single INSERT and the task activities are seeded in bulk. Like
+        bulk_create, Task.save() is not called and no post_save signal is sent.
+        """
+        from .activity import TaskActivity
+
+        due_datetimes, warning_datetimes = calculate_deadlines(
+            [task.activated_at for task in tasks],
+            [task.state.due_time + task.additional_due_time for task in tasks],
+            [task.state.due_time_warning + task.additional_due_time for task in tasks],
+        )
+        swimlanes = State.objects.get_swimlane_slugs(set(task.state_id for task in tasks))
+        now = timezone.now()
+        for task, due_datetime, warning_datetime in zip(tasks, due_datetimes, warning_datetimes):
+            task.due_datetime = due_datetime
+            task.warning_datetime = warning_datetime
+            task.swimlane_slugs = swimlanes[task.state_id]
+            task.is_activated = task.activated_at <= now
+
+        Payload.objects.store(payload for task in tasks for payload in task.unsaved_payloads())
+        tasks = self.bulk_create(tasks, batch_size=batch_size)
+        TaskActivity.objects.create_for_tasks(tasks)
+        notify_schedule_changed([task.pk for task in tasks])
+        return tasks
+
     # TODO: Rename as Process next
     def create_next_tasks(self, task):
-        if not task.state.is_final:
-            # next states
-            for next_state in task.state.next(data=task.final_data, task=task):
-                state = next_state.get('state')
-                activated_at = next_state.get('activated_at', timezone.now())
-                additional_due_time = next_state.get('additional_due_time', 0)
-                # due_time = next_state.get('due_time')
-                required_states = state.required_states()
-
-                if state.is_final:
-                    # Cancel other tasks for the same job
-                    Task.objects.cancel_active_tasks(job=task.job, finished_by=task.finished_by, data=task.final_data)
-
-                # Check for finished tasks on required states
-                for required_state in required_states:
-                    # TODO: Refactory
-                    required_task = Task.objects.filter(job=task.job, state=required_state).order_by('-modified_at').first()
-                    if not required_task.is_finished:
-                        return
-
-                if required_states.count() == 0 or Task.objects.filter(job=task.job, state__in=required_states, is_finished=True).exists():
-                    task = Task.objects.create(
-                        job=task.job,
-                        state=state,
-                        initial_data=task.final_data,
-                        final_data=task.final_data,
-                        activated_at=activated_at,
-                        additional_due_time=additional_due_time
-                    )
-                    Task.send_and_log(task_created, sender=task.job.workflow_version.slug, task_pk=task.pk)
+        """Create the tasks of the states following the task.
+
+        Runs a constant number of queries: the next states are routed through
+        the compiled workflow graph, the last task of every required state is
+        read in a single query and the new tasks are created in bulk.
+        """
+        if task.state.is_final:
+            return []
+
+        next_states = task.state.next(data=task.final_data, task=task)
+        if any(next_state.get('state').is_final for next_state in next_states):
+            # Cancel other tasks for the same job
+            Task.objects.cancel_active_tasks(job=task.job, finished_by=task.finished_by, data=task.final_data, exclude=task)
+
+        required, finished = self._required_finished(task, next_states, task.state.graph)
+        if any(pk not in finished for pks in required for pk in pks):
+            # A required state without tasks: the graph may predate a sync of
+            # the version, so it is compiled again before giving up
+            graph = get_workflow_graph(task.state.workflow_version_id, refresh=True)
+            required, finished = self._required_finished(task, next_states, graph)
+
+        tasks = []
+        for next_state, required_pks in zip(next_states, required):
+            # Check for finished tasks on required states
+            if not all(finished.get(pk, False) for pk in required_pks):
+                missing = [pk for pk in required_pks if pk not in finished]
+                if missing:
+                    logger.warning('State %s not started on job %s: its required states %s have no task', next_state.get('state').pk, task.job_id, missing)
+                break
+
+            tasks.append(Task(
+                job=task.job,
+                state=next_state.get('state'),
+                # The payload is shared, not copied
+                initial_payload_id=task.final_payload_id,
+                final_payload_id=task.final_payload_id,
+                activated_at=next_state.get('activated_at', timezone.now()),
+                additional_due_time=next_state.get('additional_due_time', 0)
+            ))
+
+        tasks = Task.objects.bulk_create_tasks(tasks)
+        Task.send_on_commit(task_created, sender=task.job.workflow_version.slug, events=[{'task_pk': new_task.pk} for new_task in tasks])
+        return tasks
+
+    def _required_finished(self, task, next_states, graph):
+        """Return the required State pks of each next state, and whether the last task of each required state is finished."""
+        required = []
+        for next_state in next_states:
+            state = next_state.get('state')
+            required_pks = graph.required_pks(state.class_name)
+            if required_pks is None:
+                required_pks = list(state.required_states().values_list('pk', flat=True))
+            required.append(required_pks)
+
+        # Last task of each required state
+        required_pks = set(pk for pks in required for pk in pks)
+        finished = {}
+        if required_pks:
+            finished = dict(
+                Task.objects.filter(job=task.job, state__in=required_pks)
+                .order_by('state', '-modified_at')
+                .distinct('state')
+                .values_list('state', 'is_finished')
+            )
+        # The task being finished counts as finished
+        finished[task.state_id] = True
+        return required, finished
 
     def get_initial_task(self, job):
         initial_state = job.workflow_version.states.get(is_initial=True)
         return job.tasks.get(state=initial_state)
 
-    def cancel_active_tasks(self, job, finished_by, data=None):
-        """Cancel active tasks for the job."""
-        for task in self.filter_active_tasks(job=job):
-            task.cancel(finished_by=finished_by, data=data)
+    def cancel_active_tasks(self, job, finished_by, data=None, exclude=None):
+        """Cancel active tasks for the job with a single UPDATE.
+
+        Keyword arguments:
+        exclude -- A task of the job to leave untouched (default None)
+        """
+        values = {
+            'is_canceled': True,
+            'is_finished': True,
+            'is_paused': False,
+            'finish_datetime': timezone.now(),
+            'finished_by': finished_by,
+        }
+        if data:
+            values['final_payload'] = Payload.objects.for_data(data)
+            Payload.objects.store([values['final_payload']])
+        tasks = self.filter_active_tasks(job=job)
+        if exclude:
+            tasks = tasks.exclude(pk=exclude.pk)
+        return tasks._update_and_log(values, TaskEvent.CANCEL, user=finished_by)
 
 
 class Task(UUIDBaseModel):
@@ -201,8 +621,11 @@ class Task(UUIDBaseModel):
     finished_by = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, null=True, on_delete=models.PROTECT, related_name='tasks_finished_by')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, null=True, on_delete=models.PROTECT, related_name='tasks')
     additional_due_time = models.PositiveIntegerField(help_text=_("Additional task's due time in minutes."), default=0)
-    initial_data = JSONField(blank=True, null=True)
-    final_data = JSONField(blank=True, null=True)
+    # Read and written through initial_data and final_data
+    initial_payload = models.ForeignKey(Payload, blank=True, null=True, editable=False, db_index=False, on_delete=models.PROTECT, related_name='+')
+    final_payload = models.ForeignKey(Payload, blank=True, null=True, editable=False, db_index=False, on_delete=models.PROTECT, related_name='+')
+    is_activated = models.BooleanField(default=False, editable=False, help_text=_('Set once the task is active: on creation, or by the workflow_scheduler command for scheduled tasks.'))
+    swimlane_slugs = ArrayField(models.SlugField(), default=list, blank=True, editable=False, help_text=_('Copy of the state swimlanes slugs, used to filter tasks by swimlane.'))
 
     start_datetime = models.DateTimeField(blank=True, null=True)
     pause_datetime = models.DateTimeField(blank=True, null=True)
@@ -231,6 +654,7 @@ class Task(UUIDBaseModel):
         [DUE_WARNING, _('Warning')],
         [DUE_LATE, _('Late')]
     ]
+    notified_due_status = models.CharField(max_length=3, choices=DUE_CHOICES, default=DUE_ON_TIME, editable=False, help_text=_('Last deadline crossing notified by the workflow_deadlines command.'))
 
 
     DUE_CSS_STATUS_CLASS_MAP = {
@@ -256,10 +680,67 @@ class Task(UUIDBaseModel):
         ordering = ['-created_at', ]
         verbose_name = _('Task')
         verbose_name_plural = _('Tasks')
+        indexes = [
+            # filter_waiting_tasks
+            models.Index(fields=['-created_at'], name='task_waiting_idx', condition=Q(user=None, is_finished=False)),
+            # filter_late_tasks, filter_warning_tasks and filter_on_time_tasks
+            models.Index(fields=['is_finished', 'due_datetime'], name='task_finished_due_idx'),
+            models.Index(fields=['is_finished', 'warning_datetime'], name='task_finished_warning_idx'),
+            # is_active
+            models.Index(fields=['activated_at'], name='task_activated_at_idx'),
+            # Last task of the required states on create_next_tasks
+            models.Index(fields=['job', 'state', '-modified_at'], name='task_job_state_idx'),
+            # cursor_page
+            models.Index(fields=['-created_at', '-id'], name='task_created_idx'),
+            # ActivationScheduler
+            models.Index(fields=['activated_at', 'id'], condition=Q(is_activated=False), name='task_activation_idx'),
+            # DeadlineScheduler
+            models.Index(fields=['warning_datetime', 'id'], condition=Q(is_finished=False, notified_due_status='ont'), name='task_warning_pending_idx'),
+            models.Index(fields=['due_datetime', 'id'], condition=Q(is_finished=False) & ~Q(notified_due_status='lat'), name='task_late_pending_idx'),
+            # filter_claimable_tasks
+            models.Index(fields=['activated_at', 'id'], condition=Q(user=None, is_finished=False, is_started=False), name='task_claimable_idx'),
+            # filter_by_swimlanes
+            GinIndex(fields=['swimlane_slugs'], name='task_swimlane_slugs_idx'),
+        ]
 
     def __str__(self):
         return f'{self.pk} - {self.job} - {self.state}'
 
+    def _get_payload(self, name, other):
+        """Return the payload of the name field, reusing the loaded one of the other field when both point to the same row."""
+        field, other = self._meta.get_field(name), self._meta.get_field(other)
+        if not field.is_cached(self) and other.is_cached(self) and getattr(self, field.attname) == getattr(self, other.attname):
+            field.set_cached_value(self, other.get_cached_value(self))
+        return getattr(self, name)
+
+    @property
+    def initial_data(self):
+        """The data the task was created with, stored on its initial_payload."""
+        return self._get_payload('initial_payload', 'final_payload').data if self.initial_payload_id else None
+
+    @initial_data.setter
+    def initial_data(self, data):
+        self.initial_payload = Payload.objects.for_data(data)
+
+    @property
+    def final_data(self):
+        """The data the task was finished with, stored on its final_payload."""
+        return self._get_payload('final_payload', 'initial_payload').data if self.final_payload_id else None
+
+    @final_data.setter
+    def final_data(self, data):
+        self.final_payload = Payload.objects.for_data(data)
+
+    def unsaved_payloads(self):
+        """Return the payloads set on the task and missing from the database."""
+        return [
+            payload for payload in [
+                self._meta.get_field('initial_payload').get_cached_value(self, None),
+                self._meta.get_field('final_payload').get_cached_value(self, None),
+            ]
+            if payload is not None and payload._state.adding
+        ]
+
     @property
     def data(self):
         """ Task data.
@@ -285,6 +766,9 @@ class Task(UUIDBaseModel):
 
     @property
     def due_status(self):
+        if hasattr(self, 'annotated_due_status'):
+            return self.annotated_due_status
+
         if self.is_finished:
             delta = self.finish_datetime - self.activated_at
         else:
@@ -346,6 +830,9 @@ class Task(UUIDBaseModel):
 
     @property
     def status(self):
+        if hasattr(self, 'annotated_status'):
+            return self.annotated_status
+
         if not self.is_started:
             return self.STATUS_WAITING
 
@@ -362,10 +849,51 @@ class Task(UUIDBaseModel):
     def workflow(self):
         return self.state.workflow_version.workflow
 
+    # Fields used to calculate the deadlines
+    DEADLINE_FIELDS = ['activated_at', 'state', 'additional_due_time']
+
     def save(self, *args, **kwargs):
-        self.due_datetime = self.calculate_due_datetime()
-        self.warning_datetime = self.calculate_warning_datetime()
+        Payload.objects.store(self.unsaved_payloads())
+        if self._state.adding:
+            self.swimlane_slugs = State.objects.get_swimlane_slugs([self.state_id])[self.state_id]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields).intersection(self.DEADLINE_FIELDS):
+            self.due_datetime = self.calculate_due_datetime()
+            self.warning_datetime = self.calculate_warning_datetime()
+            # Scheduled tasks are activated by the workflow_scheduler command
+            if self._state.adding or self.activated_at > timezone.now():
+                self.is_activated = self.activated_at <= timezone.now()
+            # Deadlines moved to the future are notified again by the workflow_deadlines command
+            if self.warning_datetime > timezone.now():
+                self.notified_due_status = self.DUE_ON_TIME
+            elif self.due_datetime > timezone.now() and self.notified_due_status == self.DUE_LATE:
+                self.notified_due_status = self.DUE_WARNING
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + ['due_datetime', 'warning_datetime', 'is_activated', 'notified_due_status']
         super().save(*args, **kwargs)
+        if self.schedule_changed:
+            notify_schedule_changed([self.pk])
+        self.track_schedule()
+
+    # Fields read by the workflow_scheduler and workflow_deadlines commands
+    SCHEDULE_FIELDS = ['activated_at', 'is_activated', 'due_datetime', 'warning_datetime', 'notified_due_status', 'is_finished']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.track_schedule()
+        return instance
+
+    def track_schedule(self):
+        """Remember the current schedule fields values to detect changes on the next save."""
+        self._tracked_schedule = {field: self.__dict__.get(field) for field in self.SCHEDULE_FIELDS}
+
+    @property
+    def schedule_changed(self):
+        tracked = getattr(self, '_tracked_schedule', None)
+        if tracked is None:
+            return True
+        return any(tracked[field] != self.__dict__.get(field) for field in self.SCHEDULE_FIELDS)
 
     def clean(self):
         errors = {}
@@ -397,6 +925,12 @@ class Task(UUIDBaseModel):
         delta_minutes = self.state.due_time_warning + self.additional_due_time
         return add_workday(self.activated_at, delta_minutes)
 
+    def _save_and_log(self, action, user=None):
+        """Save the task and append an action event to its log, in a transaction."""
+        with transaction.atomic():
+            self.save()
+            TaskEvent.objects.log(action, [(self.pk, self.job_id)], user=user)
+
     def abandon(self):
         if self.is_finished:
             raise ValidationError(_("It's not possible to abandon a finished task"))
@@ -408,7 +942,7 @@ class Task(UUIDBaseModel):
         self.user = None
         self.started_by = None
         self.start_datetime = None
-        self.save()
+        self._save_and_log(TaskEvent.ABANDON)
 
     def cancel(self, finished_by, data=None):
         """Cancel the task. It is called when the job is finished by another parallel task and do not spawn next tasks."""
@@ -419,7 +953,7 @@ class Task(UUIDBaseModel):
         self.is_paused = False
         self.finish_datetime = timezone.now()
         self.finished_by = finished_by
-        self.save()
+        self._save_and_log(TaskEvent.CANCEL, user=finished_by)
 
     def finish(self, finished_by, data=None):
         if not self.is_started:
@@ -428,19 +962,27 @@ class Task(UUIDBaseModel):
         if self.is_finished:
             raise ValidationError(_("The task is already finished."))
 
+        update_fields = ['is_finished', 'is_paused', 'finish_datetime', 'finished_by', 'modified_at']
         if data:
             self.final_data = data
-            self.save()
-        Task.objects.create_next_tasks(task=self)
-
+            update_fields.append('final_payload')
         self.is_finished = True
         self.is_paused = False
         self.finish_datetime = timezone.now()
         self.finished_by = finished_by
-        self.save()
-        Task.send_and_log(task_finished, sender=self.job.workflow_version.slug, task_pk=self.pk)
-        if self.state.is_final:
-            Task.send_and_log(job_finished, sender=self.job.workflow_version.slug, job_pk=self.job.pk)
+
+        # The next tasks and the finished task are written together, and the
+        # signals only go out once they are committed
+        sender = self.job.workflow_version.slug
+        with transaction.atomic():
+            # The next tasks share the final payload
+            Payload.objects.store(self.unsaved_payloads())
+            Task.objects.create_next_tasks(task=self)
+            self.save(update_fields=update_fields)
+            TaskEvent.objects.log(TaskEvent.FINISH, [(self.pk, self.job_id)], user=finished_by)
+            Task.send_on_commit(task_finished, sender=sender, task_pk=self.pk)
+            if self.state.is_final:
+                Task.send_on_commit(job_finished, sender=sender, job_pk=self.job_id)
 
 
     def pause(self, user=None):
@@ -456,7 +998,7 @@ class Task(UUIDBaseModel):
         self.is_paused = True
         self.paused_by = user
         self.pause_datetime = timezone.now()
-        self.save()
+        self._save_and_log(TaskEvent.PAUSE, user=user)
 
     def reopen(self, user):
         if not self.is_started:
@@ -476,7 +1018,7 @@ class Task(UUIDBaseModel):
         self.is_canceled = False
         self.finished_by = None
         self.finish_datetime = None
-        self.save()
+        self._save_and_log(TaskEvent.REOPEN, user=user)
 
     def start(self, started_by, user):
         if self.is_finished:
@@ -489,26 +1031,119 @@ class Task(UUIDBaseModel):
         self.start_datetime = timezone.now()
         self.started_by = started_by
         self.user = user
-        self.save()
+        self._save_and_log(TaskEvent.START, user=started_by)
 
     def unpause(self):
         if not self.is_paused:
             raise ValidationError(_("The task is not paused."))
 
         self.is_paused = False
-        self.save()
+        self._save_and_log(TaskEvent.UNPAUSE)
+
 
+class TaskEventManager(models.Manager):
 
-TASKS_ACTIONS_CHOICES = [
-    ['0', 'Iniciou a tarefa'],
-    ['1', 'Pausou a tarefa'],
-    ['3', 'Abandonou a tarefa'],
-    ['4', 'Finalizou a tarefa'],
-    ['5', 'Reabriu a tarefa']
-]
+    def log(self, action, tasks, user=None):
+        """Append an action event for each task with a single INSERT.
+
+        Keyword arguments:
+        action -- One of the TaskEvent actions
+        tasks -- List of (task_pk, job_pk) tuples
+        user -- The user that made the transition (default None)
+        """
+        now = timezone.now()
+        return self.bulk_create([
+            TaskEvent(created_at=now, task_id=task_pk, job_id=job_pk, user=user, action=action)
+            for task_pk, job_pk in tasks
+        ])
 
+    def for_job(self, job, since=None, until=None):
+        """Return the events of the job in the order they happened.
 
-class TaskLog(UUIDBaseModel):
-    job = models.ForeignKey(Job, on_delete=models.PROTECT)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
-    action = models.CharField(choices=TASKS_ACTIONS_CHOICES, max_length=1)
+        Keyword arguments:
+        since -- Only the events from this datetime on, skipping the older partitions (default None)
+        until -- Only the events before this datetime, skipping the newer partitions (default None)
+        """
+        events = self.filter(job=job)
+        if since:
+            events = events.filter(created_at__gte=since)
+        if until:
+            events = events.filter(created_at__lt=until)
+        return events.order_by('created_at', 'pk')
+
+    def create_partitions(self, months=3, start=None):
+        """Create the monthly partitions of the log table missing for the next months.
+
+        Events written to a month without a partition fall in the default
+        partition, and are moved to the month partition when it is created.
+
+        Keyword arguments:
+        months -- Number of months to create partitions for (default 3)
+        start -- A date of the first month (default today)
+
+        Returns the names of the created partitions.
+        """
+        table = self.model._meta.db_table
+        month = (start or timezone.now().date()).replace(day=1)
+        created = []
+        with connection.cursor() as cursor:
+            for i in range(months):
+                next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+                name = '{}_p{:%Y%m}'.format(table, month)
+                cursor.execute('SELECT to_regclass(%s)', [name])
+                if cursor.fetchone()[0] is None:
+                    with transaction.atomic():
+                        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+                        cursor.execute(
+                            f'WITH moved AS (DELETE FROM "{table}_default" WHERE created_at >= %s AND created_at < %s RETURNING *) '
+                            f'INSERT INTO "{name}" SELECT * FROM moved',
+                            [month, next_month]
+                        )
+                        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [month, next_month])
+                    created.append(name)
+                month = next_month
+        return created
+
+
+class TaskEvent(models.Model):
+    """Append-only log of the task transitions.
+
+    The table is partitioned by month of created_at (see
+    TaskEventManager.create_partitions). The foreign keys have no database
+    constraint, so the log is cheap to write and outlives deleted rows.
+    """
+    START = 1
+    PAUSE = 2
+    UNPAUSE = 3
+    ABANDON = 4
+    FINISH = 5
+    CANCEL = 6
+    REOPEN = 7
+    ACTION_CHOICES = [
+        (START, _('Started')),
+        (PAUSE, _('Paused')),
+        (UNPAUSE, _('Unpaused')),
+        (ABANDON, _('Abandoned')),
+        (FINISH, _('Finished')),
+        (CANCEL, _('Canceled')),
+        (REOPEN, _('Reopened')),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    job = models.ForeignKey(Job, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='events')
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, blank=True, null=True, related_name='+')
+    action = models.PositiveSmallIntegerField(choices=ACTION_CHOICES)
+    objects = TaskEventManager()
+
+    class Meta:
+        verbose_name = _('Task event')
+        verbose_name_plural = _('Task events')
+        indexes = [
+            # for_job
+            models.Index(fields=['job', 'created_at'], name='taskevent_job_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.task_id, self.get_action_display())
@@ -1,11 +1,9 @@
-import importlib
-
-from django.conf import settings
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.fields import AutoSlugField
+from workflows.registry import get_workflow_class
 
 from .base import ActiveMixin, UUIDBaseModel
 
@@ -31,6 +29,7 @@ class WorkflowVersionManager(models.Manager):
 class WorkflowVersion(UUIDBaseModel, ActiveMixin):
     workflow = models.ForeignKey(Workflow, on_delete=models.PROTECT, related_name='versions')
     version = models.PositiveIntegerField(default=1)
+    definition_hash = models.CharField(max_length=64, blank=True, editable=False, help_text=_('Fingerprint of the synced definition, used by workflow_sync to skip unchanged versions.'))
     objects = WorkflowVersionManager.from_queryset(WorkflowVersionQuerySet)()
 
     class Meta:
@@ -41,10 +40,7 @@ class WorkflowVersion(UUIDBaseModel, ActiveMixin):
 
     @property
     def get_class(self):
-        workflow_module = settings.WORKFLOWS_WORKFLOWS.get(self.workflow.slug).get('versions').get(self.version)
-        module_ = importlib.import_module(workflow_module)
-        class_ = getattr(module_, 'Workflow')
-        return class_
+        return get_workflow_class(self.workflow.slug, self.version)
 
     @property
     def get_forms(self):
@@ -0,0 +1,117 @@
+import base64
+import collections.abc
+import datetime
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from workflows.exceptions import InvalidCursor
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, created_at, pk):
+    """Return the opaque token pointing before or after the (created_at, pk) row."""
+    value = '{}{}|{}'.format(direction, created_at.isoformat(), pk)
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (direction, created_at, pk) tuple of a token made by encode_cursor."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value[1:].split('|')
+        direction, created_at, pk = value[0], datetime.datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor(_('Invalid cursor.'))
+    if direction not in (NEXT, PREVIOUS) or created_at.tzinfo is None:
+        raise InvalidCursor(_('Invalid cursor.'))
+    return direction, created_at, pk
+
+
+class CursorPage(collections.abc.Sequence):
+    """A page of a keyset pagination, with the cursors of its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of {} objects>'.format(len(self))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def paginate(queryset, cursor=None, per_page=50):
+    """Return a CursorPage of the queryset, newest first.
+
+    The rows are ordered by (-created_at, -id) and each page continues from the
+    row the cursor points to, so the cost of a page does not depend on how deep
+    it is and rows created meanwhile are neither skipped nor repeated.
+
+    Keyword arguments:
+    queryset -- Queryset of a model with a created_at field
+    cursor -- A next_cursor or previous_cursor of a previous page, or None for the first page
+    per_page -- Maximum number of rows of the page (default 50)
+
+    Raises InvalidCursor when the cursor can not be decoded.
+    """
+    direction = NEXT
+    if cursor:
+        direction, created_at, pk = decode_cursor(cursor)
+        # The created_at__lte/gte term bounds the index range scan, the OR is a filter on it
+        if direction == NEXT:
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk), created_at__lte=created_at)
+        else:
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk), created_at__gte=created_at)
+
+    if direction == NEXT:
+        rows = list(queryset.order_by('-created_at', '-pk')[:per_page + 1])
+        has_more, rows = len(rows) > per_page, rows[:per_page]
+        has_next, has_previous = has_more, bool(cursor)
+    else:
+        rows = list(queryset.order_by('created_at', 'pk')[:per_page + 1])
+        has_more, rows = len(rows) > per_page, rows[:per_page][::-1]
+        has_next, has_previous = True, has_more
+
+    if not rows:
+        return CursorPage(rows)
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor(NEXT, rows[-1].created_at, rows[-1].pk) if has_next else None,
+        previous_cursor=encode_cursor(PREVIOUS, rows[0].created_at, rows[0].pk) if has_previous else None,
+    )
+
+
+class CursorPaginator(object):
+    """Keyset counterpart of django.core.paginator.Paginator.
+
+    Pages are addressed by the opaque cursors of CursorPage instead of page
+    numbers, and no COUNT query is made.
+    """
+
+    def __init__(self, object_list, per_page=50):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def page(self, cursor=None):
+        return paginate(self.object_list, cursor=cursor, per_page=self.per_page)
+
+
+class CursorPaginationMixin(object):
+    """QuerySet mixin adding keyset pagination on (created_at, id)."""
+
+    def cursor_page(self, cursor=None, per_page=50):
+        """Return the CursorPage of the queryset starting at cursor, see paginate."""
+        return paginate(self, cursor=cursor, per_page=per_page)
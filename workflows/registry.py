@@ -0,0 +1,71 @@
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class ClassRegistry(object):
+    """Process wide, thread safe cache of the python classes used by workflows.
+
+    Each class is imported once per process. The hits and misses counters
+    show how effective the cache is. Only misses take the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._classes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        # Lock free fast path: dict reads are atomic, so hits never wait on
+        # other threads. The hits counter may undercount under contention.
+        class_ = self._classes.get(key)
+        if class_ is not None:
+            self.hits += 1
+            return class_
+
+        with self._lock:
+            self.misses += 1
+
+        # Load outside the lock: loaders may resolve other registry entries
+        class_ = loader()
+        with self._lock:
+            return self._classes.setdefault(key, class_)
+
+    def discard(self, key):
+        with self._lock:
+            self._classes.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._classes.clear()
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._classes)}
+
+
+registry = ClassRegistry()
+
+
+def get_state_class(class_name):
+    """Return the State class for the full python path stored on State.class_name."""
+    return registry.get(('state', class_name), lambda: import_string(class_name))
+
+
+def get_workflow_class(slug, version):
+    """Return the Workflow class of the version module defined on WORKFLOWS_WORKFLOWS."""
+    def loader():
+        workflow_module = settings.WORKFLOWS_WORKFLOWS.get(slug).get('versions').get(version)
+        return import_string(f'{workflow_module}.Workflow')
+
+    return registry.get(('workflow', slug, version), loader)
+
+
+@receiver(setting_changed)
+def clear_registry(sender, setting, **kwargs):
+    if setting == 'WORKFLOWS_WORKFLOWS':
+        registry.clear()
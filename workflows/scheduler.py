@@ -0,0 +1,255 @@
+import heapq
+import select
+import time
+
+from django.db import connection, transaction
+from django.utils import timezone
+from workflows.signals import task_activated, task_late, task_warning
+
+# Channel of the NOTIFY sent with the pks of the tasks whose schedule changed
+SCHEDULE_CHANNEL = 'workflows_task_schedule'
+
+
+def notify_schedule_changed(pks):
+    """Send the pks of the tasks to the schedulers, once the current transaction is committed.
+
+    The pks are sent with pg_notify, comma separated, in chunks fitting the
+    8000 bytes limit of a NOTIFY payload.
+    """
+    pks = [str(pk) for pk in pks]
+    if not pks or connection.vendor != 'postgresql':
+        return
+
+    def notify():
+        with connection.cursor() as cursor:
+            for i in range(0, len(pks), 500):
+                cursor.execute('SELECT pg_notify(%s, %s)', [SCHEDULE_CHANNEL, ','.join(pks[i:i + 500])])
+
+    transaction.on_commit(notify)
+
+
+class HeapScheduler(object):
+    """Base of the schedulers acting on tasks at datetimes stored on them.
+
+    The upcoming (datetime, task pk, ...) entries are kept in a min-heap,
+    loaded from an index by upcoming(), so the scheduler knows when to wake up
+    without polling the task table. fire() is called with the entries due.
+
+    The writers of the tasks send the pks of the changed tasks with
+    notify_schedule_changed(), and wait() pushes their entries to the heap as
+    they arrive. The heap is still reloaded every refresh_interval seconds, in
+    case a change was missed, and once the last loaded entry is reached when
+    there were more than heap_size entries to load.
+
+    Keyword arguments:
+    batch_size -- Maximum number of entries fired per transaction (default 500)
+    heap_size -- Maximum number of upcoming entries of each kind kept in the heap (default 10000)
+    refresh_interval -- Maximum seconds between two reloads of the heap (default 600)
+    """
+
+    def __init__(self, batch_size=500, heap_size=10000, refresh_interval=600):
+        self.batch_size = batch_size
+        self.heap_size = heap_size
+        self.refresh_interval = refresh_interval
+        self.heap = []
+        self.loaded_at = None
+        # Entries after the horizon were left out of a full heap
+        self.horizon = None
+        # The database connection the LISTEN was run on
+        self.listening = None
+
+    def upcoming(self, pks=None):
+        """Return the list of entries to load and the horizon.
+
+        Keyword arguments:
+        pks -- Only read the entries of these tasks (default all of them)
+        """
+        raise NotImplementedError
+
+    def tasks(self, pks=None):
+        """Return the tasks, or the ones of pks, to read the entries from."""
+        from workflows.models import Task
+
+        return Task.objects.all() if pks is None else Task.objects.filter(pk__in=pks)
+
+    def fire(self, entries, now):
+        """Act on the due entries and return the number of tasks changed."""
+        raise NotImplementedError
+
+    def read(self, queryset, field, *extra):
+        """Return the first heap_size (field, pk, *extra) entries of queryset, and their horizon."""
+        rows = [
+            (value, pk) + extra
+            for value, pk in queryset.order_by(field, 'pk').values_list(field, 'pk')[:self.heap_size]
+        ]
+        return rows, rows[-1][0] if len(rows) == self.heap_size else None
+
+    def load(self):
+        self.heap, self.horizon = self.upcoming()
+        heapq.heapify(self.heap)
+        self.loaded_at = timezone.now()
+
+    def push(self, pks):
+        """Push the entries of the tasks of pks to the heap.
+
+        Entries after the horizon are left for the reload of the heap. The
+        entries of the tasks changed again, already in the heap, are skipped
+        by fire().
+        """
+        entries, horizon = self.upcoming(pks)
+        for entry in entries:
+            if self.horizon is None or entry[0] < self.horizon:
+                heapq.heappush(self.heap, entry)
+
+    def listen(self):
+        """LISTEN to the schedule changes on the database connection.
+
+        Changes committed before the LISTEN are missed, so the heap is
+        reloaded on the next run_pending().
+        """
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {SCHEDULE_CHANNEL}')
+        self.listening = connection.connection
+        self.loaded_at = None
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds, returning early to push the entries of the changed tasks.
+
+        When the database connection was replaced since listen() the LISTEN
+        is run again and the method returns at once, for the heap reload.
+        Returns the number of changed tasks.
+        """
+        if connection.vendor != 'postgresql':
+            time.sleep(timeout)
+            return 0
+        connection.ensure_connection()
+        if self.listening is not connection.connection:
+            self.listen()
+            return 0
+
+        conn = connection.connection
+        if not conn.notifies and not select.select([conn], [], [], timeout)[0]:
+            return 0
+        conn.poll()
+        pks = set()
+        while conn.notifies:
+            pks.update(int(pk) for pk in conn.notifies.pop(0).payload.split(','))
+        if pks and self.loaded_at is not None:
+            self.push(pks)
+        return len(pks)
+
+    def needs_load(self, now):
+        return (
+            self.loaded_at is None
+            or (now - self.loaded_at).total_seconds() >= self.refresh_interval
+            or (self.horizon is not None and now >= self.horizon)
+        )
+
+    def send(self, signal, tasks):
+        """Send signal, on commit, for each of the (pk, workflow version pk) tasks."""
+        from workflows.models import Task, WorkflowVersion
+
+        versions = WorkflowVersion.objects.select_related('workflow').in_bulk(set(version_id for pk, version_id in tasks))
+        for version_id, version in versions.items():
+            Task.send_on_commit(
+                signal,
+                sender=version.slug,
+                events=[{'task_pk': pk} for pk, task_version_id in tasks if task_version_id == version_id]
+            )
+
+    def run_pending(self, now=None):
+        """Fire the entries due at now and return the number of tasks changed."""
+        now = now or timezone.now()
+        if self.needs_load(now):
+            self.load()
+
+        entries = []
+        while self.heap and self.heap[0][0] <= now:
+            entries.append(heapq.heappop(self.heap))
+        return sum(self.fire(entries[i:i + self.batch_size], now) for i in range(0, len(entries), self.batch_size))
+
+    def next_wakeup(self, now=None):
+        """Return the seconds to sleep until the next entry or heap reload."""
+        now = now or timezone.now()
+        seconds = self.refresh_interval - (now - self.loaded_at).total_seconds()
+        if self.heap:
+            seconds = min(seconds, (self.heap[0][0] - now).total_seconds())
+        return max(seconds, 0)
+
+
+class ActivationScheduler(HeapScheduler):
+    """Send task_activated when the scheduled tasks become active.
+
+    The entries are the activated_at of the tasks not yet activated, read from
+    the task_activation_idx index.
+    """
+
+    def upcoming(self, pks=None):
+        return self.read(self.tasks(pks).filter(is_activated=False), 'activated_at')
+
+    def fire(self, entries, now):
+        """Mark the tasks as activated and send their task_activated signals.
+
+        Tasks locked by another scheduler, already activated or rescheduled
+        since the entry was read, are skipped.
+        """
+        from workflows.models import Task
+
+        with transaction.atomic():
+            tasks = list(
+                Task.objects.filter(pk__in=[entry[1] for entry in entries], is_activated=False, activated_at__lte=now)
+                .select_for_update(skip_locked=True, of=('self', ))
+                .values_list('pk', 'job__workflow_version')
+            )
+            Task.objects.filter(pk__in=[pk for pk, version_id in tasks]).update(is_activated=True)
+            self.send(task_activated, tasks)
+        return len(tasks)
+
+
+class DeadlineScheduler(HeapScheduler):
+    """Send task_warning and task_late when unfinished tasks cross their deadlines.
+
+    The entries are the warning_datetime and due_datetime not yet notified of
+    the unfinished tasks, read from the task_warning_pending_idx and
+    task_late_pending_idx indexes. Task.notified_due_status records the last
+    signal sent, so every crossing is notified once; it is reset when the
+    deadlines of a task are moved to the future.
+    """
+
+    def upcoming(self, pks=None):
+        from workflows.models import Task
+
+        unfinished = self.tasks(pks).filter(is_finished=False)
+        warnings, warning_horizon = self.read(unfinished.filter(notified_due_status=Task.DUE_ON_TIME), 'warning_datetime', Task.DUE_WARNING)
+        lates, late_horizon = self.read(unfinished.exclude(notified_due_status=Task.DUE_LATE), 'due_datetime', Task.DUE_LATE)
+        horizons = [horizon for horizon in [warning_horizon, late_horizon] if horizon is not None]
+        return warnings + lates, min(horizons) if horizons else None
+
+    def fire(self, entries, now):
+        """Update notified_due_status of the tasks and send their signals.
+
+        Entries of tasks finished or rescheduled since the heap was loaded, or
+        locked by another scheduler, are skipped.
+        """
+        from workflows.models import Task
+
+        warning_pks = [pk for value, pk, status in entries if status == Task.DUE_WARNING]
+        late_pks = [pk for value, pk, status in entries if status == Task.DUE_LATE]
+        changed = 0
+        with transaction.atomic():
+            # Tasks already late are not warned
+            for signal, status, tasks in [
+                    (task_late, Task.DUE_LATE, Task.objects.filter(pk__in=late_pks, due_datetime__lte=now).exclude(notified_due_status=Task.DUE_LATE)),
+                    (task_warning, Task.DUE_WARNING, Task.objects.filter(pk__in=warning_pks, notified_due_status=Task.DUE_ON_TIME, warning_datetime__lte=now))]:
+                tasks = list(
+                    tasks.filter(is_finished=False)
+                    .select_for_update(skip_locked=True, of=('self', ))
+                    .values_list('pk', 'job__workflow_version')
+                )
+                if tasks:
+                    Task.objects.filter(pk__in=[pk for pk, version_id in tasks]).update(notified_due_status=status)
+                    self.send(signal, tasks)
+                    changed += len(tasks)
+        return changed
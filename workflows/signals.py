@@ -4,6 +4,19 @@ import django
 job_finished = django.dispatch.Signal(providing_args=["job_pk",])
 job_started = django.dispatch.Signal(providing_args=["job_pk",])
 
+task_activated = django.dispatch.Signal(providing_args=['task_pk', ])
 task_created = django.dispatch.Signal(providing_args=['task_pk', ])
 task_finished = django.dispatch.Signal(providing_args=['task_pk', ])
-task_started = django.dispatch.Signal(providing_args=['task_pk', ])
\ No newline at end of file
+task_late = django.dispatch.Signal(providing_args=['task_pk', ])
+task_started = django.dispatch.Signal(providing_args=['task_pk', ])
+task_warning = django.dispatch.Signal(providing_args=['task_pk', ])
+
+# Signals sent through the outbox when WORKFLOWS_OUTBOX is enabled, by name
+OUTBOX_SIGNALS = {
+    'job_finished': job_finished,
+    'task_activated': task_activated,
+    'task_created': task_created,
+    'task_finished': task_finished,
+    'task_late': task_late,
+    'task_warning': task_warning,
+}
@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.admin.utils import lookup_field
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+
+from workflows.admin.changelist import EstimatedCountPaginator, StateFilter
+from workflows.admin.job import JobAdmin
+from workflows.admin.task import TaskAdmin
+from workflows.models import Job, State, Task, WorkflowVersion
+from workflows.tests.workflow_v1 import Workflow
+
+
+@override_settings(WORKFLOWS_WORKFLOWS={'test': {'versions': {1: 'workflows.tests.workflow_v1'}}})
+class TestAdmin(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Workflow().process(slug='test', version=1)
+        cls.workflow_version = WorkflowVersion.objects.get(workflow__slug='test', version=1)
+        cls.user = get_user_model().objects.create(username='admin', is_staff=True, is_superuser=True)
+        cls.jobs = Job.objects.create_jobs(cls.workflow_version, [(f'job {i}', {'order': i}, None, cls.user) for i in range(30)])
+
+    def changelist(self, model_admin, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        return model_admin.get_changelist_instance(request)
+
+    def test_task_changelist(self):
+        model_admin = TaskAdmin(Task, AdminSite())
+        # The workflow versions of the filter, the row estimate, the count, as
+        # the table is small, and the page. The total count is not shown.
+        with self.assertNumQueries(4):
+            changelist = self.changelist(model_admin)
+            for task in changelist.result_list:
+                for name in model_admin.list_display:
+                    lookup_field(name, task, model_admin)
+        self.assertEqual(changelist.result_count, 30)
+
+        self.assertEqual(list(self.changelist(model_admin, q=self.jobs[3].name).result_list), list(self.jobs[3].tasks.all()))
+        self.assertEqual(self.changelist(model_admin, q='job').result_count, 0)
+
+        state = State.objects.get(workflow_version=self.workflow_version, slug='prepare-pizza')
+        changelist = self.changelist(model_admin, workflow_version=self.workflow_version.pk, state=state.pk)
+        self.assertEqual(changelist.result_count, 0)
+        state_filter = [spec for spec in changelist.filter_specs if isinstance(spec, StateFilter)][0]
+        self.assertEqual([name for pk, name in state_filter.lookup_choices], ['Delivery Pizza', 'Initial state', 'Prepare Pizza'])
+
+        # The states are only listed once a workflow version is selected
+        self.assertFalse(any(isinstance(spec, StateFilter) for spec in self.changelist(model_admin).filter_specs))
+
+    def test_task_change_view(self):
+        model_admin = TaskAdmin(Task, AdminSite())
+        request = RequestFactory().get('/')
+        request.user = self.user
+        task = self.jobs[0].tasks.get()
+        with self.assertNumQueries(1):
+            obj = model_admin.get_object(request, str(task.pk))
+            self.assertEqual([lookup_field(name, obj, model_admin)[2] for name in ['initial_data', 'final_data']], [{'order': 0}] * 2)
+        self.assertIsNone(model_admin.get_object(request, 'x'))
+
+    def test_estimated_count(self):
+        model_admin = JobAdmin(Job, AdminSite())
+        self.assertIsInstance(EstimatedCountPaginator(Job.objects.all(), 10).estimate(), int)
+
+        with mock.patch.object(EstimatedCountPaginator, 'estimate', return_value=10 ** 7):
+            self.assertEqual(self.changelist(model_admin).result_count, 10 ** 7)
+            self.assertEqual(self.changelist(model_admin, q=self.jobs[0].uuid).result_count, 1)
@@ -0,0 +1,51 @@
+import threading
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from workflows.models import Job, Swimlane, Task, WorkflowVersion
+from workflows.tests.workflow_v1 import Workflow
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED is checked on PostgreSQL')
+@override_settings(WORKFLOWS_WORKFLOWS={'test': {'versions': {1: 'workflows.tests.workflow_v1'}}})
+class TestConcurrentClaim(TransactionTestCase):
+    workers = 8
+    tasks = 200
+
+    def setUp(self):
+        for slug in ['clerk', 'cook', 'delivery']:
+            Swimlane.objects.create(name=slug, slug=slug)
+        Workflow().process(slug='test', version=1)
+        workflow_version = WorkflowVersion.objects.get(workflow__slug='test', version=1)
+        self.users = [get_user_model().objects.create(username=f'user {i}') for i in range(self.workers)]
+        Job.objects.create_jobs(workflow_version, [(f'job {i}', None, None, self.users[0]) for i in range(self.tasks)])
+
+    def test_no_double_assignment(self):
+        claimed = {user.pk: [] for user in self.users}
+        barrier = threading.Barrier(self.workers)
+
+        def worker(user):
+            try:
+                barrier.wait()
+                while True:
+                    tasks = Task.objects.claim(user, n=3)
+                    if not tasks:
+                        break
+                    claimed[user.pk].extend(task.pk for task in tasks)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user, )) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        pks = [pk for user_pks in claimed.values() for pk in user_pks]
+        self.assertEqual(len(pks), self.tasks)
+        self.assertEqual(len(set(pks)), self.tasks)
+        for user in self.users:
+            self.assertEqual(set(Task.objects.filter(user=user).values_list('pk', flat=True)), set(claimed[user.pk]))
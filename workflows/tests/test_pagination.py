@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from workflows.exceptions import InvalidCursor
+from workflows.models import Job, Task, WorkflowVersion
+from workflows.pagination import CursorPaginator
+from workflows.tests.workflow_v1 import Workflow
+
+
+@override_settings(WORKFLOWS_WORKFLOWS={'test': {'versions': {1: 'workflows.tests.workflow_v1'}}})
+class TestCursorPagination(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Workflow().process(slug='test', version=1)
+        cls.workflow_version = WorkflowVersion.objects.get(workflow__slug='test', version=1)
+        cls.user = get_user_model().objects.create(username='user')
+        Job.objects.create_jobs(cls.workflow_version, [(f'job {i}', None, None, cls.user) for i in range(7)])
+
+    def test_pages(self):
+        expected = list(Job.objects.order_by('-created_at', '-pk'))
+
+        pages = [Job.objects.cursor_page(per_page=3)]
+        while pages[-1].has_next():
+            pages.append(Job.objects.cursor_page(pages[-1].next_cursor, per_page=3))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([job for page in pages for job in page], expected)
+        self.assertFalse(pages[0].has_previous())
+
+        # Rows created meanwhile do not shift the following pages
+        Job.objects.create_job(workflow_version=self.workflow_version, user=self.user, name='new')
+        self.assertEqual(list(Job.objects.cursor_page(pages[0].next_cursor, per_page=3)), expected[3:6])
+
+        previous = Job.objects.cursor_page(pages[2].previous_cursor, per_page=3)
+        self.assertEqual(list(previous), expected[3:6])
+        self.assertTrue(previous.has_next())
+        self.assertTrue(previous.has_previous())
+
+    def test_paginator(self):
+        paginator = CursorPaginator(Task.objects.all(), per_page=5)
+        with self.assertNumQueries(1):
+            page = paginator.page()
+        self.assertEqual(list(page), list(Task.objects.order_by('-created_at', '-pk')[:5]))
+        self.assertEqual(len(paginator.page(page.next_cursor)), 2)
+
+        for cursor in ['x', 'invalid', page.next_cursor[:-2]]:
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
@@ -0,0 +1,126 @@
+import datetime
+from unittest import skipUnless
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from workflows.admin.task import TaskAdmin
+from workflows.models import Job, State, Task, WorkflowVersion
+from workflows.tests.workflow_v1 import Workflow
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL')
+@override_settings(WORKFLOWS_WORKFLOWS={'test': {'versions': {1: 'workflows.tests.workflow_v1'}}})
+class TestQueryPlans(TestCase):
+    """The hot Task filters must be served by the index added for them.
+
+    The tasks are seeded like a long running installation: most of them are
+    finished, half of those by an automatic activity with no user, and a few
+    are in progress, waiting or scheduled. The planner is free to pick any
+    plan, so each test fails when its index stops being the cheapest way to
+    run the query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Workflow().process(slug='test', version=1)
+        workflow_version = WorkflowVersion.objects.get(workflow__slug='test', version=1)
+        user = get_user_model().objects.create(username='user')
+        now = timezone.now()
+        jobs = Job.objects.create_jobs(workflow_version, [(f'job {i}', None, None, user) for i in range(3000)])
+        Job.objects.create_jobs(workflow_version, [(f'scheduled {i}', None, now + datetime.timedelta(days=1), user) for i in range(20)])
+        Task.objects.filter(job__in=jobs[:2900]).start_many(started_by=user, user=user)
+        Task.objects.filter(job__in=jobs[:2850]).update(
+            is_finished=True, finish_datetime=F('activated_at'), notified_due_status=Task.DUE_LATE
+        )
+        Task.objects.filter(job__in=jobs[:1400]).update(user=None)
+        # Some unfinished tasks are late or on warning
+        Task.objects.filter(job__in=jobs[2850:2870]).update(due_datetime=now - datetime.timedelta(hours=1), warning_datetime=now - datetime.timedelta(hours=2))
+        Task.objects.filter(job__in=jobs[2870:2890]).update(due_datetime=now + datetime.timedelta(hours=1), warning_datetime=now - datetime.timedelta(hours=1))
+        cls.job = jobs[0]
+        cls.states = State.objects.filter(workflow_version=workflow_version)
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE workflows_task')
+            cursor.execute('ANALYZE workflows_job')
+
+    def explain(self, queryset):
+        with CaptureQueriesContext(connection) as context:
+            list(queryset)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + context.captured_queries[-1]['sql'])
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index):
+        plan = self.explain(queryset)
+        self.assertIn(index, plan, plan)
+
+    def assertIndexCond(self, queryset, condition):
+        plan = self.explain(queryset)
+        self.assertIn(f'Index Cond: ({condition})', plan, plan)
+
+    def test_waiting_tasks(self):
+        # A page of the list, read in the order of the index with no sort
+        self.assertUsesIndex(Task.objects.filter_waiting_tasks()[:20], 'task_waiting_idx')
+
+    def test_due_status_filters(self):
+        unfinished = Task.objects.filter(is_finished=False)
+        # The finished branch of the OR is not indexable, the unfinished rows are read from the index
+        self.assertIndexCond(unfinished.filter_late_tasks(), 'is_finished = false')
+        self.assertIndexCond(unfinished.filter_warning_tasks(), 'is_finished = false')
+
+    def test_claimable_tasks(self):
+        self.assertUsesIndex(Task.objects.filter_claimable_tasks()[:1], 'task_claimable_idx')
+
+    def test_scheduler_entries(self):
+        self.assertUsesIndex(Task.objects.filter(is_activated=False).order_by('activated_at', 'pk')[:10], 'task_activation_idx')
+        self.assertUsesIndex(
+            Task.objects.filter(is_finished=False, notified_due_status=Task.DUE_ON_TIME).order_by('warning_datetime', 'pk')[:10],
+            'task_warning_pending_idx'
+        )
+        self.assertUsesIndex(
+            Task.objects.filter(is_finished=False).exclude(notified_due_status=Task.DUE_LATE).order_by('due_datetime', 'pk')[:10],
+            'task_late_pending_idx'
+        )
+
+    def test_scheduled_tasks(self):
+        self.assertUsesIndex(Task.objects.filter(activated_at__gt=timezone.now()), 'task_activated_at_idx')
+
+    def test_required_states_lookup(self):
+        self.assertUsesIndex(
+            Task.objects.filter(job=self.job, state__in=self.states)
+            .order_by('state', '-modified_at')
+            .distinct('state')
+            .values_list('state', 'is_finished'),
+            'task_job_state_idx'
+        )
+
+    def test_cursor_page(self):
+        page = Task.objects.cursor_page(per_page=10)
+        with CaptureQueriesContext(connection) as context:
+            Task.objects.cursor_page(page.next_cursor, per_page=10)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + context.captured_queries[0]['sql'])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('task_created_idx', plan, plan)
+        self.assertNotIn('Sort', plan, plan)
+
+    def test_admin_search(self):
+        # The jobs are looked up first, then the tasks by uuid or job, every condition from an index
+        with CaptureQueriesContext(connection) as context:
+            queryset, may_have_duplicates = TaskAdmin(Task, AdminSite()).get_search_results(RequestFactory().get('/'), Task.objects.all(), self.job.name)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + context.captured_queries[0]['sql'])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('job_name_idx', plan, plan)
+        plan = self.explain(queryset)
+        self.assertIn('Index Cond: ((uuid)::text = ', plan, plan)
+        self.assertIn(f'Index Cond: (job_id = {self.job.pk})', plan, plan)
+        self.assertNotIn('Seq Scan', plan, plan)
+        self.assertEqual(list(queryset), list(self.job.tasks.all()))
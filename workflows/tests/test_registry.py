@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase, override_settings
+
+from workflows.registry import ClassRegistry, get_state_class, get_workflow_class, registry
+from workflows.tests import workflow_v1
+
+
+@override_settings(WORKFLOWS_WORKFLOWS={'test': {'versions': {1: 'workflows.tests.workflow_v1'}}})
+class TestRegistry(SimpleTestCase):
+
+    def test_get(self):
+        registry = ClassRegistry()
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return workflow_v1.Workflow
+
+        self.assertIs(registry.get('key', loader), workflow_v1.Workflow)
+        self.assertIs(registry.get('key', loader), workflow_v1.Workflow)
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(registry.stats, {'hits': 1, 'misses': 1, 'size': 1})
+
+        registry.clear()
+        registry.get('key', loader)
+        self.assertEqual(len(loads), 2)
+
+    def test_state_and_workflow_classes(self):
+        registry.clear()
+        self.assertIs(get_state_class('workflows.tests.workflow_v1.PreparePizzaState'), workflow_v1.PreparePizzaState)
+        self.assertIs(get_workflow_class('test', 1), workflow_v1.Workflow)
+        misses = registry.misses
+        get_workflow_class('test', 1)
+        self.assertEqual(registry.misses, misses)
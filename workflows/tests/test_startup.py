@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+
+from django.test import SimpleTestCase
+
+# Modules only imported on first use, never while Django starts
+LAZY_MODULES = ['workalendar', 'humanize', 'workflows.tests.workflow_v1']
+
+
+class TestStartup(SimpleTestCase):
+
+    def loaded_modules(self, *modules):
+        """Return the names of sys.modules of a fresh process running django.setup() and importing modules."""
+        process = subprocess.run(
+            [
+                sys.executable, '-c',
+                'import json, sys; import django; django.setup(); '
+                + ''.join(f'import {module}; ' for module in modules)
+                + 'print(json.dumps(list(sys.modules)))'
+            ],
+            stdout=subprocess.PIPE, universal_newlines=True, check=True
+        )
+        return json.loads(process.stdout)
+
+    def test_lazy_imports(self):
+        modules = self.loaded_modules('workflows.utils', 'workflows.models')
+        self.assertIn('workflows.utils', modules)
+        for lazy_module in LAZY_MODULES:
+            self.assertEqual([name for name in modules if name == lazy_module or name.startswith(lazy_module + '.')], [])
@@ -0,0 +1,629 @@
+import datetime
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from workflows.graph import get_workflow_graph
+from workflows.models import Job, OutboxEvent, Payload, State, Swimlane, Task, TaskActivity, TaskEvent, WorkflowVersion
+from workflows.models.payload import payload_digest
+from workflows.scheduler import ActivationScheduler, DeadlineScheduler
+from workflows.signals import task_created, task_finished
+from workflows.tests import workflow_wide
+from workflows.tests.workflow_v1 import Workflow
+
+
+@override_settings(WORKFLOWS_WORKFLOWS={
+    'test': {'versions': {1: 'workflows.tests.workflow_v1'}},
+    'wide': {'versions': {1: 'workflows.tests.workflow_wide'}},
+})
+class TestTasks(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for slug in ['clerk', 'cook', 'delivery']:
+            Swimlane.objects.create(name=slug, slug=slug)
+        Workflow().process(slug='test', version=1)
+        workflow_wide.Workflow().process(slug='wide', version=1)
+        cls.workflow_version = WorkflowVersion.objects.get(workflow__slug='test', version=1)
+        cls.wide_workflow_version = WorkflowVersion.objects.get(workflow__slug='wide', version=1)
+        cls.user = get_user_model().objects.create(username='user')
+
+    def setUp(self):
+        cache.clear()
+
+    def create_job(self, **kwargs):
+        return Job.objects.create_job(workflow_version=self.workflow_version, user=self.user, **kwargs)
+
+    def test_calculate_deadlines(self):
+        for i in range(5):
+            self.create_job(name=f'job {i}')
+
+        deadlines = Task.objects.all().calculate_deadlines()
+        self.assertEqual(len(deadlines), 5)
+        for pk, due_datetime, warning_datetime in deadlines:
+            task = Task.objects.get(pk=pk)
+            self.assertEqual(due_datetime, task.calculate_due_datetime())
+            self.assertEqual(warning_datetime, task.calculate_warning_datetime())
+
+    def test_state_change_refreshes_its_tasks_deadlines(self):
+        job = self.create_job(name='job')
+        other_job = self.create_job(name='other job')
+        task = Task.objects.get(job=job)
+        other_task = Task.objects.get(job=other_job)
+        other_task.state = State.objects.get(workflow_version=self.workflow_version, slug='prepare-pizza')
+        other_task.save()
+        other_due_datetime = other_task.due_datetime
+
+        state = task.state
+        state.name = 'Renamed'
+        with self.assertNumQueries(1):
+            state.save()
+
+        state.due_time = 5 * 24 * 60
+        state.save()
+
+        task.refresh_from_db()
+        other_task.refresh_from_db()
+        self.assertEqual(task.due_datetime, task.calculate_due_datetime())
+        self.assertEqual(other_task.due_datetime, other_due_datetime)
+
+    @override_settings(WORKFLOWS_DEFER_DEADLINE_REFRESH=True)
+    def test_deferred_deadline_refresh(self):
+        task = Task.objects.get(job=self.create_job(name='job'))
+        due_datetime = task.due_datetime
+
+        state = State.objects.get(pk=task.state.pk)
+        state.due_time = 5 * 24 * 60
+        state.save()
+
+        task.refresh_from_db()
+        self.assertEqual(task.due_datetime, due_datetime)
+        self.assertTrue(State.objects.get(pk=state.pk).deadlines_outdated)
+
+        call_command('workflow_refresh_deadlines', stdout=StringIO())
+
+        task.refresh_from_db()
+        self.assertEqual(task.due_datetime, task.calculate_due_datetime())
+        self.assertFalse(State.objects.get(pk=state.pk).deadlines_outdated)
+
+    @override_settings(WORKFLOWS_DEFER_DEADLINE_REFRESH=True)
+    def test_deferred_deadline_refresh_survives_next_save(self):
+        state = State.objects.get(workflow_version=self.workflow_version, slug='prepare-pizza')
+        state.due_time = 5 * 24 * 60
+        state.save()
+        self.assertTrue(state.deadlines_outdated)
+        state.name = 'Prepare'
+        state.save()
+        self.assertTrue(State.objects.get(pk=state.pk).deadlines_outdated)
+
+        stale = State.objects.get(pk=state.pk)
+        call_command('workflow_refresh_deadlines', stdout=StringIO())
+        state.name = 'Renamed'
+        state.save()
+        self.assertFalse(State.objects.get(pk=state.pk).deadlines_outdated)
+
+        state.due_time = 6 * 24 * 60
+        state.save()
+        stale.name = 'Stale'
+        stale.save()
+        self.assertTrue(State.objects.get(pk=state.pk).deadlines_outdated)
+
+    def finish(self, task):
+        task.start(started_by=self.user, user=self.user)
+        task.finish(finished_by=self.user)
+
+    def test_filter_by_swimlanes(self):
+        job = Job.objects.create_job(workflow_version=self.workflow_version, user=self.user, name='job')
+        task = Task.objects.get(job=job)
+        state = task.state
+        self.assertEqual(task.swimlane_slugs, ['clerk'])
+
+        manager = Swimlane.objects.create(name='Manager')
+        state.swimlanes.add(manager)
+        task.refresh_from_db()
+        self.assertEqual(sorted(task.swimlane_slugs), ['clerk', 'manager'])
+        # A task in several of the swimlanes is listed once
+        self.assertEqual(list(Task.objects.filter_by_swimlanes(['clerk', 'manager'])), [task])
+        self.assertEqual(Task.objects.create(job=job, state=state).swimlane_slugs, task.swimlane_slugs)
+
+        manager.states.clear()
+        task.refresh_from_db()
+        self.assertEqual(task.swimlane_slugs, ['clerk'])
+        self.assertFalse(Task.objects.filter_by_swimlanes('manager').exists())
+
+    def test_swimlane_renamed_or_deleted(self):
+        job = Job.objects.create_job(workflow_version=self.workflow_version, user=self.user, name='job')
+        task = Task.objects.get(job=job)
+        state = task.state
+        clerk = Swimlane.objects.get(slug='clerk')
+        # Fill the cache of the state swimlanes
+        self.assertEqual(Task.objects.create(job=job, state=state).swimlane_slugs, ['clerk'])
+
+        clerk.slug = 'front-desk'
+        clerk.save()
+        task.refresh_from_db()
+        self.assertEqual(task.swimlane_slugs, ['front-desk'])
+        self.assertEqual(Task.objects.create(job=job, state=state).swimlane_slugs, ['front-desk'])
+
+        clerk.delete()
+        task.refresh_from_db()
+        self.assertEqual(task.swimlane_slugs, [])
+        self.assertEqual(Task.objects.create(job=job, state=state).swimlane_slugs, [])
+
+    def test_claim(self):
+        jobs = [self.create_job(name=f'job {i}', activated_at=timezone.now() - timedelta(minutes=10 - i)) for i in range(4)]
+        self.create_job(name='scheduled', activated_at=timezone.now() + timedelta(days=1))
+        Task.objects.filter(job=jobs[0]).start_many(started_by=self.user, user=self.user)
+
+        task = Task.objects.claim_next(self.user, swimlanes=['clerk'])
+        self.assertEqual(task.job, jobs[1])
+        self.assertTrue(task.is_started)
+        self.assertEqual(Task.objects.get(pk=task.pk).user, self.user)
+
+        self.assertEqual([task.job for task in Task.objects.claim(self.user, n=5)], jobs[2:])
+        self.assertEqual(Task.objects.claim(self.user, n=5), [])
+        self.assertIsNone(Task.objects.claim_next(self.user))
+        self.assertIsNone(Task.objects.claim_next(self.user, swimlanes=['cook']))
+
+    @override_settings(WORKFLOWS_OUTBOX=True)
+    def test_activation_scheduler(self):
+        now = timezone.now()
+        self.create_job(name='job')
+        job = self.create_job(name='scheduled', activated_at=now + timedelta(hours=1))
+        Job.objects.create_jobs(self.workflow_version, [('bulk scheduled', None, now + timedelta(hours=2), self.user)])
+        self.assertEqual(list(Task.objects.filter(is_activated=False).values_list('job__name', flat=True).order_by('activated_at')), ['scheduled', 'bulk scheduled'])
+
+        scheduler = ActivationScheduler(refresh_interval=2 * 60 * 60)
+        self.assertEqual(scheduler.run_pending(now), 0)
+        self.assertAlmostEqual(scheduler.next_wakeup(now), 60 * 60, delta=1)
+
+        # Woken up when the first task becomes active
+        self.assertEqual(scheduler.run_pending(now + timedelta(hours=1)), 1)
+        task = Task.objects.get(job=job)
+        self.assertTrue(task.is_activated)
+        self.assertEqual(list(OutboxEvent.objects.filter(signal='task_activated').values_list('payload', flat=True)), [{'task_pk': task.pk}])
+        self.assertAlmostEqual(scheduler.next_wakeup(now + timedelta(hours=1)), 60 * 60, delta=1)
+
+        # Rescheduled tasks are activated again
+        task.activated_at = now + timedelta(hours=3)
+        task.save()
+        self.assertFalse(task.is_activated)
+
+    @override_settings(WORKFLOWS_OUTBOX=True)
+    def test_deadline_scheduler(self):
+        late = Task.objects.get(job=self.create_job(name='late'))
+        task = Task.objects.get(job=self.create_job(name='job'))
+        Task.objects.filter(pk=late.pk).update(warning_datetime=timezone.now() - timedelta(hours=2), due_datetime=timezone.now() - timedelta(hours=1))
+        Task.objects.filter(pk=task.pk).update(warning_datetime=timezone.now() + timedelta(hours=1), due_datetime=timezone.now() + timedelta(hours=2))
+        task.refresh_from_db()
+
+        scheduler = DeadlineScheduler()
+        self.assertEqual(scheduler.run_pending(), 1)
+        self.assertEqual(Task.objects.get(pk=late.pk).notified_due_status, Task.DUE_LATE)
+        # Exactly at the crossing times
+        self.assertEqual(scheduler.run_pending(task.warning_datetime - timedelta(seconds=1)), 0)
+        self.assertEqual(scheduler.run_pending(task.warning_datetime), 1)
+        self.assertEqual(Task.objects.get(pk=task.pk).notified_due_status, Task.DUE_WARNING)
+        self.assertEqual(scheduler.run_pending(task.due_datetime), 1)
+        self.assertEqual(
+            list(OutboxEvent.objects.order_by('pk').values_list('signal', 'payload')),
+            [('task_late', {'task_pk': late.pk}), ('task_warning', {'task_pk': task.pk}), ('task_late', {'task_pk': task.pk})]
+        )
+
+        # Rescheduled tasks are notified again, finished ones are not
+        task.additional_due_time = 60 * 24 * 10
+        task.save()
+        self.assertEqual(task.notified_due_status, Task.DUE_ON_TIME)
+        late.start(started_by=self.user, user=self.user)
+        late.finish(finished_by=self.user)
+        scheduler = DeadlineScheduler()
+        pks = [entry[1] for entry in scheduler.upcoming()[0]]
+        self.assertEqual(pks.count(task.pk), 2)
+        self.assertNotIn(late.pk, pks)
+
+    def test_create_next_tasks(self):
+        job = Job.objects.create_job(workflow_version=self.wide_workflow_version, user=self.user, name='job')
+        task = Task.objects.get(job=job)
+        task.start(started_by=self.user, user=self.user)
+        task = Task.objects.get(pk=task.pk)
+        get_workflow_graph(self.wide_workflow_version.pk)
+
+        # Constant, whatever the number of next and required states, and
+        # wrapped in a SAVEPOINT here as the test already runs in a transaction
+        with CaptureQueriesContext(connection) as context, self.assertNumQueries(13):
+            task.finish(finished_by=self.user)
+        # A single UPDATE of the changed columns
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('due_datetime', updates[0])
+
+        tasks = {task.state.slug: task for task in Task.objects.filter(job=job, is_finished=False)}
+        self.assertEqual(set(tasks), {'prepare-dough', 'prepare-sauce', 'prepare-toppings'})
+        self.assertEqual(TaskActivity.objects.filter(task=tasks['prepare-dough']).count(), 2)
+        for new_task in tasks.values():
+            self.assertEqual(new_task.due_datetime, new_task.calculate_due_datetime())
+            self.assertEqual(new_task.warning_datetime, new_task.calculate_warning_datetime())
+
+        # The join only starts when all its required states are finished
+        self.finish(tasks['prepare-dough'])
+        self.finish(tasks['prepare-sauce'])
+        self.assertFalse(Task.objects.filter(job=job, state__slug='bake-pizza').exists())
+        self.finish(tasks['prepare-toppings'])
+        self.assertTrue(Task.objects.filter(job=job, state__slug='bake-pizza', is_finished=False).exists())
+
+        # Reaching the final state cancels the other active tasks
+        parallel_task = Task.objects.create(job=job, state=tasks['prepare-sauce'].state)
+        self.finish(Task.objects.get(job=job, state__slug='bake-pizza'))
+        parallel_task.refresh_from_db()
+        self.assertTrue(parallel_task.is_canceled)
+        self.assertFalse(Task.objects.get(job=job, state__slug='bake-pizza').is_canceled)
+        self.assertTrue(Task.objects.filter(job=job, state__slug='delivery-pizza', is_finished=False).exists())
+
+    def test_create_next_tasks_with_stale_graph(self):
+        job = Job.objects.create_job(workflow_version=self.wide_workflow_version, user=self.user, name='job')
+        self.finish(Task.objects.get(job=job))
+        tasks = {task.state.slug: task for task in Task.objects.filter(job=job, is_finished=False)}
+        self.finish(tasks['prepare-dough'])
+        self.finish(tasks['prepare-sauce'])
+
+        # A graph compiled before the states were synced again
+        graph = get_workflow_graph(self.wide_workflow_version.pk)
+        graph.state_pks[workflow_wide.PrepareSauceState().fullname] = 0
+        self.finish(tasks['prepare-toppings'])
+        self.assertTrue(Task.objects.filter(job=job, state__slug='bake-pizza', is_finished=False).exists())
+        self.assertIsNot(get_workflow_graph(self.wide_workflow_version.pk), graph)
+
+    def test_activities_seeding(self):
+        state = State.objects.get(workflow_version=self.wide_workflow_version, slug='prepare-dough')
+        job = Job.objects.create_job(workflow_version=self.wide_workflow_version, user=self.user, name='job')
+
+        # INSERT of the task and a single INSERT for its activities, once the
+        # swimlanes and activities of the state are cached
+        with self.assertNumQueries(4):
+            Task.objects.create(job=job, state=state)
+        with self.assertNumQueries(2):
+            task = Task.objects.create(job=job, state=state)
+        self.assertEqual(TaskActivity.objects.filter(task=task).count(), 2)
+
+        state.activities.first().delete()
+        task = Task.objects.create(job=job, state=state)
+        self.assertEqual(TaskActivity.objects.filter(task=task).count(), 1)
+
+    def test_create_jobs(self):
+        state = State.objects.get(workflow_version=self.wide_workflow_version, is_initial=True)
+        state.activities.create(name='Check', slug='check')
+        received = []
+
+        def receiver(sender, task_pk, **kwargs):
+            received.append(task_pk)
+
+        task_created.connect(receiver)
+        self.addCleanup(task_created.disconnect, receiver)
+
+        # The first call fills the state activities cache. The signals go
+        # through the outbox, as on_commit callbacks never run in a TestCase
+        queries = []
+        for size in [1, 2, 20]:
+            rows = [(f'job {i}', {'order': i}, None, self.user) for i in range(size)]
+            with CaptureQueriesContext(connection) as context, self.settings(WORKFLOWS_OUTBOX=True):
+                jobs = Job.objects.create_jobs(self.wide_workflow_version, rows)
+            queries.append(len(context))
+
+            self.assertEqual(len(jobs), size)
+            tasks = Task.objects.filter(job__in=jobs, state=state)
+            self.assertEqual(tasks.count(), size)
+            self.assertEqual(TaskActivity.objects.filter(task__in=tasks).count(), size)
+            self.assertEqual(tasks.get(job=jobs[-1]).initial_data, {'order': size - 1})
+
+        self.assertEqual(queries[1], queries[2])
+        self.assertEqual(OutboxEvent.objects.count(), 23)
+        self.assertEqual(OutboxEvent.objects.dispatch(), 23)
+        self.assertEqual(len(received), 23)
+
+    def test_payloads(self):
+        order = {'pizza': 'margherita', 'extras': ['basil'] * 100}
+        jobs = [self.create_job(name=f'job {i}', data=dict(order)) for i in range(2)]
+        task = Task.objects.get(job=jobs[0])
+        # The shared payload is read once
+        with self.assertNumQueries(1):
+            self.assertEqual((task.initial_data, task.final_data, task.data), (order, order, order))
+        with self.assertNumQueries(1):
+            tasks = list(Task.objects.filter(job__in=jobs).with_payloads())
+            self.assertEqual([(task.initial_data, task.final_data) for task in tasks], [(order, order)] * 2)
+        self.finish(task)
+
+        # The data copied along the tasks of both jobs is stored once
+        next_task = Task.objects.get(job=jobs[0], is_finished=False)
+        self.assertEqual(next_task.initial_data, order)
+        self.assertEqual(Payload.objects.count(), 1)
+
+        next_task.start(started_by=self.user, user=self.user)
+        next_task.finish(finished_by=self.user, data=dict(order, baked=True))
+        self.assertEqual(Payload.objects.count(), 2)
+        last_task = Task.objects.get(job=jobs[0], is_finished=False)
+        self.assertEqual(last_task.initial_payload_id, next_task.final_payload_id)
+        self.assertEqual(last_task.data, dict(order, baked=True))
+
+        Task.objects.filter(job=jobs[1]).cancel_many(finished_by=self.user, data=order)
+        self.assertEqual(Task.objects.get(job=jobs[1]).final_data, order)
+        self.assertEqual(Payload.objects.count(), 2)
+
+    def test_for_listing(self):
+        jobs = Job.objects.create_jobs(self.workflow_version, [(f'job {i}', {'order': i}, None, self.user) for i in range(500)])
+        Task.objects.filter(job__in=jobs[:100]).start_many(started_by=self.user, user=self.user)
+
+        with self.assertNumQueries(1):
+            rows = [
+                (str(task), task.workflow.slug, task.user, task.status_display, task.due_status_display, task.time_until_due, task.overdue_time)
+                for task in Task.objects.for_listing()
+            ]
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(sum(1 for row in rows if row[2] == self.user), 100)
+
+        with self.assertNumQueries(1):
+            rows = [(str(job), str(job.workflow_version), job.created_by.username) for job in Job.objects.for_listing()]
+        self.assertEqual(len(rows), 500)
+
+    def test_bulk_transitions(self):
+        for i in range(3):
+            self.create_job(name=f'job {i}')
+        tasks = Task.objects.filter(job__workflow_version=self.workflow_version)
+        first, second, third = tasks.order_by('pk')
+        first.start(started_by=self.user, user=self.user)
+
+        # The rejections, then the locked read, UPDATE and event INSERT in a SAVEPOINT
+        with self.assertNumQueries(6):
+            result = tasks.start_many(started_by=self.user, user=self.user)
+        self.assertEqual(result.updated, 2)
+        self.assertEqual(list(result.rejected), [first.pk])
+        self.assertEqual(tasks.filter(is_started=True, user=self.user).count(), 3)
+
+        result = tasks.filter(pk=second.pk).pause_many(user=self.user)
+        self.assertEqual(result, (1, {}))
+        result = tasks.pause_many(user=self.user)
+        self.assertEqual(result.updated, 2)
+        self.assertEqual(set(result.rejected), {second.pk})
+
+        result = tasks.unpause_many()
+        self.assertEqual(result.updated, 3)
+        self.assertFalse(tasks.filter(is_paused=True).exists())
+
+        result = tasks.filter(pk=third.pk).cancel_many(finished_by=self.user)
+        self.assertEqual(result.updated, 1)
+
+        result = tasks.abandon_many()
+        self.assertEqual(result.updated, 2)
+        self.assertEqual(set(result.rejected), {third.pk})
+        self.assertEqual(tasks.filter(user=None, is_started=False).count(), 2)
+
+    def test_task_events(self):
+        job = self.create_job(name='job')
+        other_job = self.create_job(name='other job')
+        task = Task.objects.get(job=job)
+        task.start(started_by=self.user, user=self.user)
+        task.pause(user=self.user)
+        task.unpause()
+        Task.objects.filter(job__in=[job, other_job]).abandon_many()
+        Task.objects.claim(self.user, n=2)
+        task.refresh_from_db()
+        task.finish(finished_by=self.user)
+
+        with self.assertNumQueries(1):
+            events = list(TaskEvent.objects.for_job(job))
+        self.assertEqual(
+            [(event.task_id, event.action) for event in events],
+            [(task.pk, action) for action in [TaskEvent.START, TaskEvent.PAUSE, TaskEvent.UNPAUSE, TaskEvent.ABANDON, TaskEvent.START, TaskEvent.FINISH]]
+        )
+        self.assertEqual(events[-1].user, self.user)
+        self.assertEqual(list(other_job.events.values_list('action', flat=True)), [TaskEvent.ABANDON, TaskEvent.START])
+        self.assertFalse(TaskEvent.objects.for_job(job, since=timezone.now()).exists())
+
+    def test_task_event_partitions(self):
+        # Months far from the partitions created by the migration, whatever the current date
+        event = TaskEvent.objects.create(task_id=1, job_id=1, action=TaskEvent.START, created_at=datetime.datetime(2100, 1, 15, tzinfo=datetime.timezone.utc))
+
+        # The event written before the month partition existed is moved into it
+        created = TaskEvent.objects.create_partitions(months=2, start=datetime.date(2100, 1, 1))
+        self.assertEqual(created, ['workflows_taskevent_p210001', 'workflows_taskevent_p210002'])
+        self.assertEqual(TaskEvent.objects.create_partitions(months=2, start=datetime.date(2100, 1, 1)), [])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM workflows_taskevent_p210001')
+            self.assertEqual(cursor.fetchall(), [(event.pk, )])
+
+        # The command starts from the current month
+        out = StringIO()
+        with mock.patch('django.utils.timezone.now', return_value=datetime.datetime(2100, 2, 28, 23, 59, tzinfo=datetime.timezone.utc)):
+            call_command('workflow_task_event_partitions', months=3, stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), ['workflows_taskevent_p210003 created', 'workflows_taskevent_p210004 created'])
+
+    def test_annotate_due_status(self):
+        now = timezone.now()
+        for i in range(3):
+            self.create_job(name=f'job {i}')
+        late, warning, on_time = Task.objects.filter(job__workflow_version=self.workflow_version).order_by('pk')
+        Task.objects.filter(pk=late.pk).update(warning_datetime=now - timedelta(hours=2), due_datetime=now - timedelta(hours=1))
+        Task.objects.filter(pk=warning.pk).update(warning_datetime=now - timedelta(hours=1), due_datetime=now + timedelta(hours=1))
+        Task.objects.filter(pk=on_time.pk).update(warning_datetime=now + timedelta(hours=1), due_datetime=now + timedelta(hours=2))
+
+        tasks = Task.objects.filter(job__workflow_version=self.workflow_version).annotate_due_status()
+        self.assertEqual(
+            {task.pk: task.due_status for task in tasks},
+            {late.pk: Task.DUE_LATE, warning.pk: Task.DUE_WARNING, on_time.pk: Task.DUE_ON_TIME}
+        )
+        for status, queryset in [
+                (Task.DUE_LATE, Task.objects.filter_late_tasks()),
+                (Task.DUE_WARNING, Task.objects.filter_warning_tasks()),
+                (Task.DUE_ON_TIME, Task.objects.filter_on_time_tasks())]:
+            self.assertEqual(set(tasks.filter(annotated_due_status=status)), set(queryset))
+
+        result = tasks.filter(annotated_due_status=Task.DUE_LATE).start_many(started_by=self.user, user=self.user)
+        self.assertEqual(result.updated, 1)
+
+    def test_summary(self):
+        for i in range(3):
+            self.create_job(name=f'job {i}')
+        Task.objects.filter(job__name='job 0').start_many(started_by=self.user, user=self.user)
+        Task.objects.filter(job__name='job 1').update(due_datetime=timezone.now() - timedelta(hours=1))
+
+        with self.assertNumQueries(1):
+            summary = Task.objects.filter(job__workflow_version=self.workflow_version).summary()
+        counts = {(row['workflow'], row['swimlane'], row['status'], row['due_status']): row['count'] for row in summary}
+        self.assertEqual(counts, {
+            ('test', 'clerk', Task.STATUS_IN_PROGRESS, Task.DUE_ON_TIME): 1,
+            ('test', 'clerk', Task.STATUS_WAITING, Task.DUE_LATE): 1,
+            ('test', 'clerk', Task.STATUS_WAITING, Task.DUE_ON_TIME): 1,
+        })
+
+        # Querysets built with the current time share the cached result
+        tasks = Task.objects.filter(job__workflow_version=self.workflow_version)
+        cached = tasks.is_active().summary(cache_key='test')
+        self.assertCountEqual(cached, summary)
+        with self.assertNumQueries(0):
+            self.assertEqual(tasks.is_active().summary(cache_key='test'), cached)
+
+
+@override_settings(WORKFLOWS_WORKFLOWS={'test': {'versions': {1: 'workflows.tests.workflow_v1'}}})
+class TestFinishTransaction(TransactionTestCase):
+
+    def setUp(self):
+        for slug in ['clerk', 'cook', 'delivery']:
+            Swimlane.objects.create(name=slug, slug=slug)
+        Workflow().process(slug='test', version=1)
+        self.user = get_user_model().objects.create(username='user')
+        job = Job.objects.create_job(workflow_version=WorkflowVersion.objects.get(workflow__slug='test', version=1), user=self.user, name='job')
+        self.task = Task.objects.get(job=job)
+        self.task.start(started_by=self.user, user=self.user)
+
+    def test_activation_scheduler_change_feed(self):
+        now = timezone.now()
+        scheduler = ActivationScheduler(refresh_interval=4 * 60 * 60)
+        scheduler.listen()
+        scheduler.run_pending(now)
+        loaded_at = scheduler.loaded_at
+        self.assertEqual(scheduler.heap, [])
+
+        # New future activations go straight to the heap, with no reload
+        version = self.task.job.workflow_version
+        job = Job.objects.create_job(workflow_version=version, user=self.user, name='scheduled', activated_at=now + timedelta(hours=1))
+        jobs = Job.objects.create_jobs(version, [('bulk scheduled', None, now + timedelta(hours=2), self.user)])
+        self.assertEqual(scheduler.wait(1), 2)
+        task, bulk_task = Task.objects.get(job=job), Task.objects.get(job=jobs[0])
+        self.assertEqual(sorted(scheduler.heap), [(task.activated_at, task.pk), (bulk_task.activated_at, bulk_task.pk)])
+        self.assertAlmostEqual(scheduler.next_wakeup(now), 60 * 60, delta=1)
+
+        # The entry of a rescheduled task is pushed again, the old one is skipped
+        task.activated_at = now + timedelta(hours=3)
+        task.save()
+        self.assertEqual(scheduler.wait(1), 1)
+        self.assertEqual(scheduler.run_pending(now + timedelta(hours=1)), 0)
+        self.assertEqual(scheduler.run_pending(now + timedelta(hours=3)), 2)
+        self.assertFalse(Task.objects.filter(is_activated=False).exists())
+        self.assertEqual(scheduler.loaded_at, loaded_at)
+
+    def test_deadline_scheduler_change_feed(self):
+        scheduler = DeadlineScheduler()
+        scheduler.listen()
+        scheduler.run_pending()
+        loaded_at = scheduler.loaded_at
+        self.assertEqual(scheduler.wait(0), 0)
+
+        # The committed changes are pushed to the heap, with no reload
+        job = Job.objects.create_job(workflow_version=self.task.job.workflow_version, user=self.user, name='other job')
+        task = Task.objects.get(job=job)
+        self.assertEqual(scheduler.wait(1), 1)
+        self.assertIn((task.due_datetime, task.pk, Task.DUE_LATE), scheduler.heap)
+
+        Task.objects.filter(pk=task.pk).update(additional_due_time=60)
+        Task.objects.filter(pk=task.pk).update_deadlines()
+        task.refresh_from_db()
+        self.assertEqual(scheduler.wait(1), 1)
+        self.assertIn((task.due_datetime, task.pk, Task.DUE_LATE), scheduler.heap)
+
+        self.task.finish(finished_by=self.user)
+        self.assertEqual(scheduler.wait(1), 2)
+        next_task = Task.objects.get(job=self.task.job, is_finished=False)
+        self.assertIn((next_task.warning_datetime, next_task.pk, Task.DUE_WARNING), scheduler.heap)
+        self.assertEqual(scheduler.loaded_at, loaded_at)
+
+    def test_signals_on_commit(self):
+        sent = []
+
+        def receiver(signal, **kwargs):
+            sent.append((signal, kwargs.get('task_pk'), Task.objects.filter(job=self.task.job).count()))
+
+        for signal in [task_created, task_finished]:
+            signal.connect(receiver)
+            self.addCleanup(signal.disconnect, receiver)
+
+        with transaction.atomic():
+            self.task.finish(finished_by=self.user)
+            self.assertEqual(sent, [])
+        next_task = Task.objects.get(job=self.task.job, is_finished=False)
+        self.assertEqual(sent, [(task_created, next_task.pk, 2), (task_finished, self.task.pk, 2)])
+
+    def test_rollback(self):
+        with mock.patch.object(TaskActivity.objects, 'create_for_tasks', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.task.finish(finished_by=self.user, data={'size': 'large'})
+
+        self.assertEqual(Task.objects.filter(job=self.task.job).count(), 1)
+        task = Task.objects.get(pk=self.task.pk)
+        self.assertFalse(task.is_finished)
+        self.assertIsNone(task.final_data)
+
+    @override_settings(WORKFLOWS_OUTBOX=True)
+    def test_outbox(self):
+        received = []
+
+        def receiver(sender, task_pk, **kwargs):
+            received.append(task_pk)
+            if len(received) == 1:
+                raise RuntimeError('unavailable')
+
+        task_finished.connect(receiver)
+        self.addCleanup(task_finished.disconnect, receiver)
+
+        # The events are written in the finish transaction, and the receivers
+        # only called by the worker
+        self.task.finish(finished_by=self.user)
+        self.assertEqual(received, [])
+        event = OutboxEvent.objects.get(signal='task_finished')
+        self.assertEqual(OutboxEvent.objects.filter(signal='task_created').count(), 1)
+
+        call_command('workflow_outbox', once=True, stdout=StringIO())
+        event.refresh_from_db()
+        self.assertEqual((event.attempts, received), (1, [self.task.pk]))
+        self.assertIn('unavailable', event.last_error)
+        self.assertFalse(OutboxEvent.objects.filter(signal='task_created').exists())
+
+        # Retried once the backoff is over
+        OutboxEvent.objects.filter(pk=event.pk).update(available_at=timezone.now())
+        call_command('workflow_outbox', once=True, stdout=StringIO())
+        self.assertEqual(received, [self.task.pk, self.task.pk])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(WORKFLOWS_OUTBOX=True)
+    def test_outbox_database_error(self):
+        payload = Payload.objects.create(digest=payload_digest({}), data={})
+
+        def receiver(sender, task_pk, **kwargs):
+            Payload.objects.create(digest=payload.digest, data={})
+
+        task_finished.connect(receiver)
+        self.addCleanup(task_finished.disconnect, receiver)
+
+        # The failed event is rolled back to its savepoint, the rest of the
+        # batch is delivered and the failure is recorded
+        self.task.finish(finished_by=self.user)
+        self.assertEqual(OutboxEvent.objects.dispatch(), 2)
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.signal, event.attempts), ('task_finished', 1))
+        self.assertIn('IntegrityError', event.last_error)
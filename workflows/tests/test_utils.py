@@ -5,7 +5,8 @@ from django.contrib.auth import get_user_model
 from django.test import TestCase
 from workflows.tests.factories import WorkflowVersionFactory
 from workflows.tests.workflow_v1 import Workflow
-from workflows.utils import add_workday
+from workalendar.america import Brazil
+from workflows.utils import WorkingCalendar, add_workday, add_workdays
 
 
 class TestUtils(TestCase):
@@ -26,3 +27,45 @@ class TestUtils(TestCase):
         
             result = add_workday(initial_datetime, test.get('minutes'))
             self.assertEqual(result, final_datetime)
+
+    def test_working_calendar(self):
+        brazil = Brazil()
+        working_calendar = WorkingCalendar(Brazil())
+
+        day = datetime.date(2019, 12, 1)
+        while day < datetime.date(2021, 2, 1):
+            for delta in [0, 1, 2, 3, 5, 22, 260]:
+                self.assertEqual(working_calendar.add_working_days(day, delta), brazil.add_working_days(day, delta))
+                self.assertEqual(working_calendar.sub_working_days(day, delta), brazil.sub_working_days(day, delta))
+            day += datetime.timedelta(days=1)
+
+        initial_datetime = datetime.datetime(2020, 7, 31, 17, 0)
+        for delta in [0, 1, -1]:
+            self.assertEqual(working_calendar.add_working_days(initial_datetime, delta), brazil.add_working_days(initial_datetime, delta))
+
+    def test_add_workdays(self):
+        timezone = pytz.timezone("America/Sao_Paulo")
+        initial_datetimes = [
+            timezone.localize(datetime.datetime(2020, 7, 27, 8, 0) + datetime.timedelta(minutes=97 * i))
+            for i in range(200)
+        ]
+        minutes = [(i * 53) % 5000 for i in range(200)]
+
+        self.assertEqual(
+            add_workdays(initial_datetimes, minutes),
+            [add_workday(initial_datetime, delta) for initial_datetime, delta in zip(initial_datetimes, minutes)]
+        )
+        self.assertEqual(
+            add_workdays(initial_datetimes, 2880),
+            [add_workday(initial_datetime, 2880) for initial_datetime in initial_datetimes]
+        )
+
+        initial_datetimes = [
+            timezone.localize(datetime.datetime(2019, 12, 20, 8, 0) + datetime.timedelta(hours=29 * i))
+            for i in range(400)
+        ]
+        minutes = [(0, 600, 1440 * 20, 1440 * 400)[i % 4] for i in range(400)]
+        self.assertEqual(
+            add_workdays(initial_datetimes, minutes),
+            [add_workday(initial_datetime, delta) for initial_datetime, delta in zip(initial_datetimes, minutes)]
+        )
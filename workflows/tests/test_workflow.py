@@ -1,10 +1,15 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
+from workflows.graph import definition_hash_cache_key, get_workflow_graph
+from workflows.models import Job, WorkflowVersion
+from workflows.tests import workflow_v1
 from workflows.tests.factories import WorkflowVersionFactory
 from workflows.tests.workflow_v1 import Workflow
 
 
+@override_settings(WORKFLOWS_WORKFLOWS={'test': {'versions': {1: 'workflows.tests.workflow_v1'}}})
 class TestJobs(TestCase):
 
     @classmethod
@@ -14,4 +19,119 @@ class TestJobs(TestCase):
         cls.workflow = workflow
 
     def test_workflow(self):
-        print (self.workflow)
\ No newline at end of file
+        print (self.workflow)
+
+    def test_graph(self):
+        workflow_version = WorkflowVersion.objects.get(workflow__slug='test', version=1)
+        graph = get_workflow_graph(workflow_version.pk)
+        states = {state.class_name: state for state in workflow_version.states.all()}
+
+        self.assertEqual(graph.state_pks, {class_name: state.pk for class_name, state in states.items()})
+        self.assertEqual(graph.final, {workflow_v1.DeliveryPizzaState().fullname})
+        self.assertEqual(graph.initial, workflow_v1.ReceiveOrderState().fullname)
+        self.assertEqual(graph.required_pks(workflow_v1.PreparePizzaState().fullname), [])
+
+        state = states[workflow_v1.ReceiveOrderState().fullname]
+        with self.assertNumQueries(1):
+            next_states = state.next()
+        self.assertEqual([next_state['state'] for next_state in next_states], [states[workflow_v1.PreparePizzaState().fullname]])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(list(state.required_states()), [])
+
+    def test_graph_rebuilt_after_sync(self):
+        workflow_version = WorkflowVersion.objects.get(workflow__slug='test', version=1)
+        graph = get_workflow_graph(workflow_version.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(get_workflow_graph(workflow_version.pk), graph)
+
+        # Synced by another process, once the cached hash expires
+        WorkflowVersion.objects.filter(pk=workflow_version.pk).update(definition_hash='changed')
+        self.assertIs(get_workflow_graph(workflow_version.pk), graph)
+        cache.delete(definition_hash_cache_key(workflow_version.pk))
+        rebuilt = get_workflow_graph(workflow_version.pk)
+        self.assertIsNot(rebuilt, graph)
+        self.assertEqual(rebuilt.state_pks, graph.state_pks)
+
+
+class TestSync(TestCase):
+
+    def test_unchanged_version_is_skipped(self):
+        workflow_version, synced = Workflow().process(slug='test', version=1)
+        self.assertTrue(synced)
+        self.assertEqual(workflow_version.definition_hash, Workflow().fingerprint())
+
+        # Workflow and version lookups only
+        with self.assertNumQueries(2):
+            workflow_version, synced = Workflow().process(slug='test', version=1)
+        self.assertFalse(synced)
+        self.assertTrue(Workflow().process(slug='test', version=1, force=True)[1])
+
+    def test_changed_definition(self):
+        workflow_version, synced = Workflow().process(slug='test', version=1)
+        job = Job.objects.create_job(workflow_version=workflow_version, user=get_user_model().objects.create(username='user'))
+        task = job.tasks.get()
+
+        class ReceiveOrderState(workflow_v1.ReceiveOrderState):
+            due_time = 40
+            swimlanes = ['clerk', 'manager']
+            activities = {'check': {'name': 'Check', 'status': {'ok': 'OK', 'ko': 'KO'}}}
+
+        class ChangedWorkflow(Workflow):
+            initial_state = ReceiveOrderState
+            states = [ReceiveOrderState, workflow_v1.PreparePizzaState, workflow_v1.DeliveryPizzaState]
+
+        self.assertNotEqual(ChangedWorkflow().fingerprint(), Workflow().fingerprint())
+        workflow_version, synced = ChangedWorkflow().process(slug='test', version=1)
+        self.assertTrue(synced)
+
+        state = workflow_version.states.get(slug='initial_state')
+        self.assertEqual(state.due_time, 40)
+        self.assertEqual(sorted(state.swimlanes.values_list('slug', flat=True)), ['clerk', 'manager'])
+        self.assertEqual(sorted(state.activities.get().status.values_list('slug', flat=True)), ['ko', 'ok'])
+        self.assertEqual(workflow_version.states.count(), 3)
+
+        task.refresh_from_db()
+        self.assertEqual(task.swimlane_slugs, ['clerk', 'manager'])
+        self.assertEqual(task.due_datetime, task.calculate_due_datetime())
+
+        # Activities removed from the definition are reported, not deleted
+        self.assertEqual(Workflow().check_orphans(workflow_version), [('initial_state', 'check', None)])
+
+        class RenamedStatusState(ReceiveOrderState):
+            activities = {'check': {'name': 'Check', 'status': {'ok': 'OK'}}}
+
+        class RenamedStatusWorkflow(ChangedWorkflow):
+            initial_state = RenamedStatusState
+            states = [RenamedStatusState, workflow_v1.PreparePizzaState, workflow_v1.DeliveryPizzaState]
+
+        with self.assertNumQueries(1):
+            orphans = RenamedStatusWorkflow().check_orphans(workflow_version)
+        self.assertEqual(orphans, [('initial_state', 'check', 'ko')])
+
+        class RenamedActivityState(ReceiveOrderState):
+            activities = {'check': {'name': 'Double check', 'status': {'ok': 'Fine', 'ko': 'KO'}}}
+
+        class RenamedActivityWorkflow(ChangedWorkflow):
+            initial_state = RenamedActivityState
+            states = [RenamedActivityState, workflow_v1.PreparePizzaState, workflow_v1.DeliveryPizzaState]
+
+        RenamedActivityWorkflow().process(slug='test', version=1)
+        activity = state.activities.get()
+        self.assertEqual(activity.name, 'Double check')
+        self.assertEqual(dict(activity.status.values_list('slug', 'name')), {'ok': 'Fine', 'ko': 'KO'})
+
+    def test_state_process(self):
+        workflow_version, synced = Workflow().process(slug='test', version=1)
+
+        class ReceiveOrderState(workflow_v1.ReceiveOrderState):
+            name = 'Receive order'
+            swimlanes = ['clerk', 'manager']
+            activities = {'check': {'name': 'Check', 'status': {'ok': 'OK'}}}
+
+        with self.assertWarns(DeprecationWarning):
+            state = ReceiveOrderState().process(workflow_version, is_initial=True)
+        self.assertEqual(state, workflow_version.states.get(slug='initial_state'))
+        self.assertEqual(state.name, 'Receive order')
+        self.assertEqual(sorted(state.swimlanes.values_list('slug', flat=True)), ['clerk', 'manager'])
+        self.assertEqual(list(state.activities.values_list('slug', 'status__slug')), [('check', 'ok')])
@@ -0,0 +1,80 @@
+from workflows.workflow import BaseWorkflow, State
+
+
+class BaseState(State):
+    due_time_warning = 3
+    due_time = 4
+    max_unassigned_time = 2
+    max_unassigned_time_warning = 1
+    swimlanes = ['clerk', ]
+
+
+class ReceiveOrderState(BaseState):
+    description = 'Initial state'
+    name = 'Receive order'
+    slug = 'receive-order'
+
+    def next(self, data, task):
+        return [PrepareDoughState, PrepareSauceState, PrepareToppingsState]
+
+
+class PrepareDoughState(BaseState):
+    description = 'Prepare the dough'
+    name = 'Prepare dough'
+    slug = 'prepare-dough'
+    activities = {
+        'knead': {'name': 'Knead', 'status': {'done': 'Done'}},
+        'rest': {'name': 'Rest', 'status': {'done': 'Done'}},
+    }
+
+    def next(self, data, task):
+        return [BakePizzaState, ]
+
+
+class PrepareSauceState(BaseState):
+    description = 'Prepare the sauce'
+    name = 'Prepare sauce'
+    slug = 'prepare-sauce'
+
+    def next(self, data, task):
+        return [BakePizzaState, ]
+
+
+class PrepareToppingsState(BaseState):
+    description = 'Prepare the toppings'
+    name = 'Prepare toppings'
+    slug = 'prepare-toppings'
+
+    def next(self, data, task):
+        return [BakePizzaState, ]
+
+
+class BakePizzaState(BaseState):
+    description = 'Bake the pizza'
+    name = 'Bake pizza'
+    slug = 'bake-pizza'
+    required = [PrepareDoughState, PrepareSauceState, PrepareToppingsState]
+
+    def next(self, data, task):
+        return [DeliveryPizzaState, ]
+
+
+class DeliveryPizzaState(BaseState):
+    description = 'Delivery pizza to client'
+    is_final = True
+    name = 'Delivery Pizza'
+    slug = 'delivery-pizza'
+
+
+class Workflow(BaseWorkflow):
+    description = 'Sell pizza made to order'
+    initial_state = ReceiveOrderState
+    slug = 'sell-pizza-wide'
+    states = [
+        ReceiveOrderState,
+        PrepareDoughState,
+        PrepareSauceState,
+        PrepareToppingsState,
+        BakePizzaState,
+        DeliveryPizzaState,
+    ]
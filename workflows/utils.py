@@ -1,11 +1,156 @@
 import datetime
+import functools
 import re
+import threading
 
 from django.conf import settings
+from django.utils.module_loading import import_string
 import pytz
-from workalendar.america import Brazil
 
-cal = Brazil()
+
+class WorkingCalendar(object):
+    """Working day arithmetic over precomputed per-year tables.
+
+    The working days of every loaded year are kept as a sorted list of date
+    ordinals, together with a rank table holding, for each day ordinal, the
+    number of working days before it. Adding or subtracting working days is
+    then two list lookups instead of a day by day walk over the calendar.
+    The results are the same as ``add_working_days`` and
+    ``sub_working_days`` of the wrapped workalendar calendar: datetimes are
+    reduced to their date and a ``date`` is always returned, even for a zero
+    ``delta``.
+
+    The calendar may be given as the dotted path of its class, which is then
+    imported and instantiated on first use, so importing this module does
+    not import workalendar.
+    """
+
+    def __init__(self, calendar):
+        self._calendar = calendar
+        self._lock = threading.Lock()
+        self._years = {}
+        self._first_year = None
+        self._last_year = None
+        # (first ordinal, ranks, working day ordinals)
+        self._tables = (0, [0], [])
+
+    @property
+    def calendar(self):
+        if isinstance(self._calendar, str):
+            self._calendar = import_string(self._calendar)()
+        return self._calendar
+
+    def _working_ordinals(self, year):
+        if year not in self._years:
+            first = datetime.date(year, 1, 1).toordinal()
+            last = datetime.date(year, 12, 31).toordinal()
+            self._years[year] = [
+                ordinal for ordinal in range(first, last + 1)
+                if self.calendar.is_working_day(datetime.date.fromordinal(ordinal))
+            ]
+        return self._years[year]
+
+    def _load(self, first_year, last_year):
+        with self._lock:
+            if self._first_year is not None:
+                if first_year >= self._first_year and last_year <= self._last_year:
+                    return
+                first_year = min(first_year, self._first_year)
+                last_year = max(last_year, self._last_year)
+
+            working_days = []
+            for year in range(first_year, last_year + 1):
+                working_days.extend(self._working_ordinals(year))
+
+            base = datetime.date(first_year, 1, 1).toordinal()
+            end = datetime.date(last_year, 12, 31).toordinal()
+            ranks = []
+            count = 0
+            for ordinal in range(base, end + 2):
+                ranks.append(count)
+                if count < len(working_days) and working_days[count] == ordinal:
+                    count += 1
+
+            self._tables = (base, ranks, working_days)
+            self._first_year = first_year
+            self._last_year = last_year
+
+    def _extend(self, day, delta):
+        if self._first_year is None:
+            self._load(day.year, day.year)
+        elif day.year < self._first_year:
+            self._load(day.year, self._last_year)
+        elif day.year > self._last_year:
+            self._load(self._first_year, day.year)
+        elif delta > 0:
+            self._load(self._first_year, self._last_year + 1)
+        else:
+            self._load(self._first_year - 1, self._last_year)
+
+    def add_working_days(self, day, delta):
+        """Return the date ``delta`` working days after ``day``."""
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+        if delta == 0:
+            return day
+
+        ordinal = day.toordinal()
+        while True:
+            base, ranks, working_days = self._tables
+            offset = ordinal - base
+            if 0 <= offset < len(ranks) - 1:
+                if delta > 0:
+                    index = ranks[offset + 1] + delta - 1
+                else:
+                    index = ranks[offset] + delta
+                if 0 <= index < len(working_days):
+                    return datetime.date.fromordinal(working_days[index])
+            self._extend(day, delta)
+
+    def sub_working_days(self, day, delta):
+        """Return the date ``delta`` working days before ``day``."""
+        return self.add_working_days(day, -abs(delta))
+
+    def add_working_days_to_ordinals(self, ordinals, deltas):
+        """Batch add_working_days over lists of date ordinals.
+
+        The tables are extended once for the whole batch, then every row is
+        resolved with two list lookups. Returns a list of date ordinals.
+        """
+        if not ordinals:
+            return []
+
+        first, last = min(ordinals), max(ordinals)
+        forward, backward = max(deltas), min(deltas)
+        while True:
+            base, ranks, working_days = self._tables
+            if not (base <= first and last - base < len(ranks) - 1):
+                self._extend(datetime.date.fromordinal(first if first < base else last), 0)
+            elif ranks[last - base + 1] + forward - 1 >= len(working_days):
+                self._extend(datetime.date.fromordinal(last), 1)
+            elif ranks[first - base] + backward < 0:
+                self._extend(datetime.date.fromordinal(first), -1)
+            else:
+                break
+
+        results = []
+        for ordinal, delta in zip(ordinals, deltas):
+            if delta > 0:
+                results.append(working_days[ranks[ordinal - base + 1] + delta - 1])
+            elif delta < 0:
+                results.append(working_days[ranks[ordinal - base] + delta])
+            else:
+                results.append(ordinal)
+        return results
+
+
+working_calendar = WorkingCalendar('workalendar.america.Brazil')
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name):
+    return pytz.timezone(name)
+
 
 def camel_to_snake_case(name):
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
@@ -28,7 +173,7 @@ def fullname(o):
       return module + '.' + o.__class__.__name__
 
 
-def add_workday(initial_datetime, minutes, start_workday_hour=9, end_workday_hour=18):
+def _add_workday_parts(initial_datetime, minutes, start_workday_hour, end_workday_hour):
     minutes += (initial_datetime.hour * 60) + initial_datetime.minute
 
     days = int(minutes / 1440)
@@ -36,19 +181,25 @@ def add_workday(initial_datetime, minutes, start_workday_hour=9, end_workday_hou
     hours_remains = int(total_minutes_remains / 60)
     minutes_remains = total_minutes_remains % 60
 
-    result = cal.add_working_days(initial_datetime, days)
-
-    timezone = pytz.timezone(settings.TIME_ZONE)
+    result = working_calendar.add_working_days(initial_datetime, days)
 
     if hours_remains > end_workday_hour:
       hours_remains = start_workday_hour
       minutes_remains = 0
-      result = cal.add_working_days(result, 1)
+      result = working_calendar.add_working_days(result, 1)
 
     if hours_remains < start_workday_hour:
       hours_remains = start_workday_hour
       minutes_remains = 0
 
+    return result, hours_remains, minutes_remains
+
+
+def add_workday(initial_datetime, minutes, start_workday_hour=9, end_workday_hour=18):
+    result, hours_remains, minutes_remains = _add_workday_parts(initial_datetime, minutes, start_workday_hour, end_workday_hour)
+
+    timezone = get_timezone(settings.TIME_ZONE)
+
     result = timezone.localize(
         datetime.datetime(
           year=result.year,
@@ -61,6 +212,72 @@ def add_workday(initial_datetime, minutes, start_workday_hour=9, end_workday_hou
     return result
 
 
+def _workday_slots(initial_datetimes, minutes, start_workday_hour, end_workday_hour):
+    """Return the (date ordinal, hour, minute) of add_workday for every row."""
+    totals = [delta + (initial_datetime.hour * 60) + initial_datetime.minute for initial_datetime, delta in zip(initial_datetimes, minutes)]
+    ordinals = working_calendar.add_working_days_to_ordinals(
+        [initial_datetime.toordinal() for initial_datetime in initial_datetimes],
+        [int(total / 1440) for total in totals]
+    )
+
+    hours = [int((total % 1440) / 60) for total in totals]
+    # Past the end of the work window: start of the next working day
+    ordinals = working_calendar.add_working_days_to_ordinals(ordinals, [1 if hour > end_workday_hour else 0 for hour in hours])
+
+    slots = []
+    for ordinal, total, hour in zip(ordinals, totals, hours):
+        if hour > end_workday_hour or hour < start_workday_hour:
+            slots.append((ordinal, start_workday_hour, 0))
+        else:
+            slots.append((ordinal, hour, total % 60))
+    return slots
+
+
+def _localize_slots(slots, localized):
+    # Deadlines concentrate on a few day/hour slots, so localize each one once.
+    timezone = get_timezone(settings.TIME_ZONE)
+    results = []
+    for slot in slots:
+        result = localized.get(slot)
+        if result is None:
+            ordinal, hour, minute = slot
+            result = localized[slot] = timezone.localize(
+                datetime.datetime.combine(datetime.date.fromordinal(ordinal), datetime.time(hour, minute))
+            )
+        results.append(result)
+    return results
+
+
+def add_workdays(initial_datetimes, minutes, start_workday_hour=9, end_workday_hour=18):
+    """Batch version of add_workday.
+
+    Keyword arguments:
+    initial_datetimes -- Sequence of datetimes
+    minutes -- Sequence of minutes to add, one per datetime, or a single amount for all of them
+    """
+    initial_datetimes = list(initial_datetimes)
+    if isinstance(minutes, int):
+        minutes = [minutes] * len(initial_datetimes)
+
+    slots = _workday_slots(initial_datetimes, list(minutes), start_workday_hour, end_workday_hour)
+    return _localize_slots(slots, {})
+
+
+def calculate_deadlines(activated_at, due_minutes, warning_minutes):
+    """Return the lists of due and warning datetimes for many tasks at once.
+
+    Keyword arguments:
+    activated_at -- Sequence of activation datetimes
+    due_minutes -- Sequence of due times in minutes (state due time plus additional due time)
+    warning_minutes -- Sequence of warning times in minutes
+    """
+    activated_at = list(activated_at)
+    localized = {}
+    due_slots = _workday_slots(activated_at, list(due_minutes), 9, 18)
+    warning_slots = _workday_slots(activated_at, list(warning_minutes), 9, 18)
+    return _localize_slots(due_slots, localized), _localize_slots(warning_slots, localized)
+
+
 def sub_workday(initial_datetime, minutes, start_workday_hour=9, end_workday_hour=18):
     minutes += (initial_datetime.hour * 60) + initial_datetime.minute
 
@@ -69,14 +286,14 @@ def sub_workday(initial_datetime, minutes, start_workday_hour=9, end_workday_hou
     hours_remains = int(total_minutes_remains / 60)
     minutes_remains = total_minutes_remains % 60
 
-    result = cal.sub_working_days(initial_datetime, days)
+    result = working_calendar.sub_working_days(initial_datetime, days)
 
-    timezone = pytz.timezone(settings.TIME_ZONE)
+    timezone = get_timezone(settings.TIME_ZONE)
 
     if hours_remains > end_workday_hour:
       hours_remains = start_workday_hour
       minutes_remains = 0
-      result = cal.add_working_days(result, 1)
+      result = working_calendar.add_working_days(result, 1)
 
     if hours_remains < start_workday_hour:
       hours_remains = start_workday_hour
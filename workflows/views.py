@@ -19,7 +19,7 @@ class FinishTaskView(View):
         return None
 
     def get_task(self, task_id):
-        return get_object_or_404(Task, pk=task_id)
+        return get_object_or_404(Task.objects.with_payloads(), pk=task_id)
 
     def get_success_redirect(self, request):
         if self.success_redirect is None:
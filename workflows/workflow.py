@@ -1,13 +1,21 @@
+import hashlib
+import json
 import re
+import warnings
+from functools import reduce
+from operator import or_
 
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.text import slugify
 
 from workflows.conf import settings as workflows_settings
-from workflows.exceptions import SwinlaneDoesNotExist
+from workflows.graph import definition_hash_cache_key
 from workflows.models import Activity, ActivityStatus
 from workflows.models import State as StateModel
-from workflows.models import Swimlane, Workflow, WorkflowVersion
+from workflows.models import Swimlane, Task, Workflow, WorkflowVersion
 from workflows.utils import camel_to_snake_case, fullname
 
 
@@ -26,71 +34,43 @@ class State(object):
     def fullname(self):
         return fullname(self)
 
-    def _check_activities(self, state):
-        if hasattr(self, 'activities'):
-            for activity in self.activities:
-                activity = Activity.objects.create_from_config(state=state, slug=activity, config=self.activities[activity])
-
-    def _check_orphans_activities(self, state):
-        for activity_instance in Activity.objects.filter(state=state):
-            print(f' :: Checking Activity "{activity_instance}"')
-            if hasattr(self, 'activities'):
-                activity = self.activities.get(activity_instance.slug)
-                if activity:
-                    # Check status
-                    for status_instance in ActivityStatus.objects.filter(activity=activity_instance):
-                        if not activity.get('status').get(status_instance.slug):
-                            print(f'    !! Orphan status: {status_instance.slug} on activity {activity_instance.slug} on state {state}')
-
-                else:
-                    print(f'    !! Orphan activity {activity_instance.slug} on state {state}')
-            else:
-                print(f'    !! Orphan activity {activity_instance.slug} on state {state}')
-
-    def _check_swimlanes(self):
-        for swimlane_slug in self.swimlanes:
-            swinlane, created = Swimlane.objects.get_or_create(slug=swimlane_slug, defaults={'name': swimlane_slug})
-
-    def _create_db_instance(self, workflow_version, is_initial):
-        state, created = StateModel.objects.get_or_create(
-            slug=self.slug,
-            workflow_version=workflow_version,
-            defaults={
-                "due_time": self.due_time,
-                "due_time_warning": self.due_time_warning,
-                "max_unassigned_time": self.max_unassigned_time,
-                "max_unassigned_time_warning": self.max_unassigned_time_warning
-            }
-        )
-        state.class_name = fullname(self)
-        state.name = self.name
-        state.description = self.description
-        state.is_final = self.is_final
-        state.is_initial = is_initial
-        state.due_time = self.due_time
-        state.due_time_warning = self.due_time_warning
-        state.max_unassigned_time = self.max_unassigned_time
-        state.max_unassigned_time_warning = self.max_unassigned_time_warning
+    def get_definition(self, is_initial):
+        """Return the values of the State model fields for the state."""
+        definition = {
+            'class_name': fullname(self),
+            'name': self.name,
+            'description': self.description,
+            'is_final': self.is_final,
+            'is_initial': is_initial,
+            'due_time': self.due_time,
+            'due_time_warning': self.due_time_warning,
+            'max_unassigned_time': self.max_unassigned_time,
+            'max_unassigned_time_warning': self.max_unassigned_time_warning,
+        }
         if self.order:
-            state.order = self.order
-        state.swimlanes.clear()
-
-        for swimlane in self.swimlanes:
-            try:
-                swimlane_instance = Swimlane.objects.get(slug=swimlane)
-                state.swimlanes.add(swimlane_instance)
-            except ObjectDoesNotExist:
-                raise SwinlaneDoesNotExist('The swimlane "{}" defined on {} was not found.'.format(swimlane, self.__class__))
+            definition['order'] = self.order
+        return definition
 
-        state.save()
-
-        return state
+    def get_activities(self):
+        """Return the activities config of the state, by activity slug."""
+        return getattr(self, 'activities', {})
 
     def process(self, workflow_version, is_initial):
-        self._check_swimlanes()
-        state = self._create_db_instance(workflow_version, is_initial)
-        self._check_activities(state=state)
-        self._check_orphans_activities(state=state)
+        """Write the state, its swimlanes and activities to the database.
+
+        Deprecated: BaseWorkflow.process() syncs all the states of a version
+        in bulk. Returns the State model instance.
+        """
+        warnings.warn(
+            'State.process() is deprecated, sync the whole workflow with BaseWorkflow.process()',
+            DeprecationWarning, stacklevel=2
+        )
+        workflow = BaseWorkflow()
+        with transaction.atomic():
+            states = workflow._sync_states(workflow_version, [(self, is_initial)])
+            workflow._sync_swimlanes(states)
+            workflow._sync_activities(states)
+        return states[self.slug][1]
 
 
 class BaseWorkflow(object):
@@ -105,12 +85,33 @@ class BaseWorkflow(object):
 
     def _create_db_instance(self, slug, version):
         workflow, created = Workflow.objects.get_or_create(slug=slug, defaults={"description": self.description})
-        workflow.description = self.description
-        workflow.save()
+        if workflow.description != self.description:
+            workflow.description = self.description
+            workflow.save()
 
         workflow_version, created = WorkflowVersion.objects.get_or_create(workflow=workflow, version=version)
         return workflow_version
 
+    def get_states(self):
+        """Return a list of (State instance, is_initial) tuples."""
+        return [(StateClass(), StateClass == self.initial_state) for StateClass in self.states]
+
+    def fingerprint(self):
+        """Return a hash of everything process writes to the database."""
+        definition = {
+            'description': self.description,
+            'states': [
+                dict(
+                    state.get_definition(is_initial),
+                    slug=state.slug,
+                    swimlanes=sorted(state.swimlanes),
+                    activities=state.get_activities(),
+                )
+                for state, is_initial in self.get_states()
+            ],
+        }
+        return hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode()).hexdigest()
+
     def _check_forms(self):
         """ Check for unique slugs """
         slugs = []
@@ -123,21 +124,144 @@ class BaseWorkflow(object):
                     duplicate = list(set(forms_slugs) & set(slugs))
                     raise Exception(f'The forms slug must be unique. There is a duplicated one: {duplicate} ')
 
-    def process(self, slug, version):
+    def process(self, slug, version, force=False):
+        """Write the workflow definition to the database as the given version.
+
+        Versions whose definition did not change since their last sync, as
+        told by their definition_hash, are skipped unless force is set. The
+        states, swimlanes and activities are written with bulk queries and
+        Task.save() or State.save() are not called: the tasks deadlines and
+        swimlanes of the changed states are refreshed in bulk.
+
+        Returns a (WorkflowVersion instance, synced) tuple, synced being False
+        when the version was skipped.
+        """
         self._check_forms()
-        workflow_version = self._create_db_instance(slug, version)
 
         slugs = [state.slug for state in self.states]
         if len(slugs) > len(set(slugs)):
             # TODO: Create custom Exception
             raise Exception('There is two states with the same slug')
 
-        for StateClass in self.states:
-            state = StateClass()
-            is_initial = False
-            if self.initial_state == StateClass:
-                is_initial = True
-            state.process(workflow_version=workflow_version, is_initial=is_initial)
+        fingerprint = self.fingerprint()
+        workflow_version = self._create_db_instance(slug, version)
+        if workflow_version.definition_hash == fingerprint and not force:
+            return workflow_version, False
+
+        with transaction.atomic():
+            states = self._sync_states(workflow_version)
+            self._sync_swimlanes(states)
+            self._sync_activities(states)
+            workflow_version.definition_hash = fingerprint
+            WorkflowVersion.objects.filter(pk=workflow_version.pk).update(definition_hash=fingerprint)
+        # The other processes rebuild their graphs of the version
+        cache.set(definition_hash_cache_key(workflow_version.pk), fingerprint, workflows_settings.WORKFLOWS_GRAPH_CACHE_TIMEOUT)
+        return workflow_version, True
+
+    def _sync_states(self, workflow_version, states=None):
+        """Create the new states and update the changed ones. Returns a dict of (State instance, model instance) tuples by slug.
+
+        Keyword arguments:
+        states -- List of (State instance, is_initial) tuples to sync (default the states of the workflow)
+        """
+        definitions = states if states is not None else self.get_states()
+        instances = {instance.slug: instance for instance in StateModel.objects.filter(workflow_version=workflow_version)}
+        states, created, changed = {}, [], []
+        for state, is_initial in definitions:
+            definition = state.get_definition(is_initial)
+            instance = instances.get(state.slug)
+            if instance is None:
+                instance = StateModel(workflow_version=workflow_version, slug=state.slug, **definition)
+                created.append(instance)
+            elif any(getattr(instance, field) != value for field, value in definition.items()):
+                for field, value in definition.items():
+                    setattr(instance, field, value)
+                instance.modified_at = timezone.now()
+                changed.append(instance)
+            states[state.slug] = (state, instance)
+
+        StateModel.objects.bulk_create(created)
+        StateModel.objects.bulk_update(changed, list(StateModel.DEADLINE_FIELDS) + [
+            'class_name', 'name', 'description', 'is_final', 'is_initial', 'order', 'modified_at'
+        ])
+        Task.objects.refresh_state_deadlines([instance for instance in changed if instance.deadlines_changed])
+        return states
+
+    def _sync_swimlanes(self, states):
+        """Create the missing swimlanes and set the swimlanes of the states."""
+        slugs = set(slug for state, instance in states.values() for slug in state.swimlanes)
+        swimlanes = dict(Swimlane.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+        created = Swimlane.objects.bulk_create([Swimlane(slug=slug, name=slug) for slug in slugs if slug not in swimlanes])
+        swimlanes.update({swimlane.slug: swimlane.pk for swimlane in created})
+
+        Through = StateModel.swimlanes.through
+        wanted = set((instance.pk, swimlanes[slug]) for state, instance in states.values() for slug in state.swimlanes)
+        existing = set(Through.objects.filter(state__in=[instance.pk for state, instance in states.values()]).values_list('state', 'swimlane'))
+        Through.objects.bulk_create([Through(state_id=state_id, swimlane_id=swimlane_id) for state_id, swimlane_id in wanted - existing])
+        removed = existing - wanted
+        if removed:
+            Through.objects.filter(reduce(or_, [Q(state=state_id, swimlane=swimlane_id) for state_id, swimlane_id in removed])).delete()
+        Task.objects.sync_swimlane_slugs(set(state_id for state_id, swimlane_id in wanted ^ existing))
+
+    def _sync_activities(self, states):
+        """Create the missing activities and activity status of the states, and rename the renamed ones."""
+        instances = {instance.pk: instance for state, instance in states.values()}
+        now = timezone.now()
+        activities, renamed = {}, []
+        for pk, state_id, slug, name in Activity.objects.filter(state__in=instances).values_list('pk', 'state', 'slug', 'name'):
+            activities[(state_id, slug)] = pk
+            config = states[instances[state_id].slug][0].get_activities().get(slug)
+            if config is not None and config.get('name') != name:
+                renamed.append(Activity(pk=pk, name=config.get('name'), modified_at=now))
+        created = Activity.objects.bulk_create([
+            Activity(state=instance, slug=slug, name=config.get('name'))
+            for state, instance in states.values()
+            for slug, config in state.get_activities().items()
+            if (instance.pk, slug) not in activities
+        ])
+        Activity.objects.bulk_update(renamed, ['name', 'modified_at'])
+        activities.update({(activity.state_id, activity.slug): activity.pk for activity in created})
+        for state_id in set(activity.state_id for activity in created):
+            cache.delete(Activity.objects.state_cache_key(state_id))
+
+        names = {
+            (activities[(instance.pk, slug)], status): name
+            for state, instance in states.values()
+            for slug, config in state.get_activities().items()
+            for status, name in config.get('status').items()
+        }
+        existing, renamed = set(), []
+        for pk, activity_id, slug, name in ActivityStatus.objects.filter(activity__in=activities.values()).values_list('pk', 'activity', 'slug', 'name'):
+            existing.add((activity_id, slug))
+            if (activity_id, slug) in names and names[(activity_id, slug)] != name:
+                renamed.append(ActivityStatus(pk=pk, name=names[(activity_id, slug)], modified_at=now))
+        ActivityStatus.objects.bulk_create([
+            ActivityStatus(activity_id=activity_id, slug=status, name=name)
+            for (activity_id, status), name in names.items()
+            if (activity_id, status) not in existing
+        ])
+        ActivityStatus.objects.bulk_update(renamed, ['name', 'modified_at'])
+
+    def check_orphans(self, workflow_version):
+        """Return the activities and activity status on the database missing from the definition.
+
+        Returns a list of (state slug, activity slug, status slug) tuples, with
+        a None status slug for orphan activities.
+        """
+        activities, statuses = set(), set()
+        for state, is_initial in self.get_states():
+            for slug, config in state.get_activities().items():
+                activities.add((state.slug, slug))
+                statuses.update((state.slug, slug, status) for status in config.get('status'))
+
+        rows = Activity.objects.filter(state__workflow_version=workflow_version).values_list('state__slug', 'slug', 'status__slug')
+        orphans = set()
+        for state_slug, slug, status in rows:
+            if (state_slug, slug) not in activities:
+                orphans.add((state_slug, slug, None))
+            elif status is not None and (state_slug, slug, status) not in statuses:
+                orphans.add((state_slug, slug, status))
+        return sorted(orphans, key=lambda orphan: (orphan[0], orphan[1], orphan[2] or ''))
 
     def get_form(self, slug):
         return self.forms.get(slug)